@@ -4,8 +4,136 @@ Defines base classes for transaction fetchers and trade parsers
 Supports both EVM and non-EVM chains (Solana, Sui, etc.)
 """
 
+import atexit
+import re
+import shelve
+import threading
+import time
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional, Any
+from functools import lru_cache
+from importlib import import_module
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# One pooled HTTP session shared by all fetchers, so repeated explorer/RPC
+# calls reuse keep-alive TCP+TLS connections instead of reconnecting
+SHARED_SESSION = requests.Session()
+_SHARED_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=64,
+    # raise_on_status=False: after the last retry, callers still get the
+    # response and report the HTTP error themselves
+    max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504],
+                      raise_on_status=False),
+)
+SHARED_SESSION.mount('https://', _SHARED_ADAPTER)
+SHARED_SESSION.mount('http://', _SHARED_ADAPTER)
+# Released once at exit: closing it earlier would cut off every other fetcher
+atexit.register(SHARED_SESSION.close)
+
+# EVM address format (20 bytes hex), compiled once. Used with fullmatch:
+# $ would also accept a trailing newline
+_EVM_ADDRESS_RE = re.compile(r'0x[0-9a-fA-F]{40}')
+
+
+def is_evm_address(address: str) -> bool:
+    """Check for a 0x-prefixed, 40 hex digit EVM address"""
+    return bool(address) and _EVM_ADDRESS_RE.fullmatch(address) is not None
+
+
+# Max calls per JSON-RPC batch POST (providers cap batches; 50 is safe everywhere)
+RPC_BATCH_SIZE = 50
+
+
+def post_json_rpc_batch(endpoint: str, rpc_calls: List[Dict], batch_size: int = RPC_BATCH_SIZE,
+                        headers: Optional[Dict] = None, timeout: int = 60,
+                        fallback_endpoints: Sequence[str] = (), retries: int = 3,
+                        wait_for_rate_limit: Optional[Callable[[], None]] = None) -> List[Any]:
+    """
+    Send JSON-RPC calls as batched POSTs (one JSON array body per chunk)
+    
+    A chunk whose POST fails (HTTP error, rejected batch, missing replies,
+    rate-limit errors) is re-sent to the fallback endpoints, and the whole
+    round is repeated up to `retries` times with a growing wait. Only the
+    calls still unanswered are re-sent.
+    
+    Args:
+        endpoint: JSON-RPC endpoint URL
+        rpc_calls: List of {"method": str, "params": list}
+        batch_size: Max calls per HTTP request; longer lists are chunked
+        fallback_endpoints: Endpoints to try, in order, when `endpoint` fails
+        retries: Rounds over all endpoints before a call is given up
+        wait_for_rate_limit: Called before every POST to pace requests
+    
+    Returns:
+        Results in the same order as rpc_calls (None where a call failed;
+        failures are reported)
+    """
+    results = [None] * len(rpc_calls)
+    endpoints = [endpoint, *fallback_endpoints]
+    
+    for start in range(0, len(rpc_calls), batch_size):
+        pending = set(range(start, min(start + batch_size, len(rpc_calls))))
+        
+        for attempt in range(retries):
+            for url in endpoints:
+                if not pending:
+                    break
+                payload = [
+                    {'jsonrpc': '2.0', 'id': i, 'method': rpc_calls[i]['method'],
+                     'params': rpc_calls[i].get('params', [])}
+                    for i in sorted(pending)
+                ]
+                if wait_for_rate_limit:
+                    wait_for_rate_limit()
+                try:
+                    response = SHARED_SESSION.post(url, json=payload, headers=headers, timeout=timeout)
+                    if response.status_code != 200:
+                        print(f"Batch RPC HTTP Error {response.status_code} from {url}")
+                        continue
+                    
+                    replies = response.json()
+                    if isinstance(replies, dict):
+                        # Some nodes answer a rejected batch with a single error object
+                        print(f"Batch RPC Error from {url}: "
+                              f"{replies.get('error', {}).get('message', 'Unknown error')}")
+                        continue
+                    
+                    # Replies may come back in any order; match them up by id
+                    for reply in replies:
+                        reply_id = reply.get('id')
+                        if reply_id not in pending:
+                            continue
+                        error = reply.get('error')
+                        if error is None:
+                            results[reply_id] = reply.get('result')
+                            pending.discard(reply_id)
+                            continue
+                        message = error.get('message', 'Unknown error')
+                        if 'limit' in message.lower() or 'rate' in message.lower():
+                            continue  # Rate limited: keep it pending and retry
+                        # The call itself is invalid; retrying won't help
+                        print(f"RPC Error for {rpc_calls[reply_id]['method']} (call {reply_id}): {message}")
+                        pending.discard(reply_id)
+                except Exception as e:
+                    print(f"Batch RPC request error from {url}: {e}")
+            
+            if not pending:
+                break
+            if attempt < retries - 1:
+                wait_time = (attempt + 1) * 5  # Backoff: 5s, 10s, ...
+                print(f"  {len(pending)} batched RPC calls unanswered, waiting {wait_time}s before retry...")
+                time.sleep(wait_time)
+        
+        if pending:
+            print(f"⚠ Batch RPC: {len(pending)} of the calls in chunk {start // batch_size + 1} "
+                  f"failed after {retries} retries: {sorted(pending)}")
+    
+    return results
 
 
 class BlockchainTransactionFetcher(ABC):
@@ -37,6 +165,65 @@ class BlockchainTransactionFetcher(ABC):
     def validate_address(self, address: str) -> bool:
         """Validate that the address format is correct for this blockchain"""
         pass
+    
+    def fetch_batch(self, rpc_calls: List[Dict]) -> List[Any]:
+        """
+        Execute several JSON-RPC calls in as few HTTP round trips as possible
+        
+        Fetchers backed by a JSON-RPC node override this; REST explorer APIs
+        have no batch endpoint and raise.
+        
+        Args:
+            rpc_calls: List of {"method": str, "params": list}
+        
+        Returns:
+            One result per call, in call order (None where a call failed)
+        """
+        raise NotImplementedError(f"{type(self).__name__} has no JSON-RPC endpoint to batch calls against")
+
+
+class CachingFetcherMixin:
+    """
+    Persistent on-disk cache for fetched transaction data
+    
+    Historical transactions don't change once they are CONFIRMATION_DEPTH
+    blocks deep, so fetchers cache that settled part and on later runs only
+    fetch what came after it. Set FETCH_CACHE_FILE to None to disable.
+    """
+    
+    FETCH_CACHE_FILE = 'fetch_cache'
+    CONFIRMATION_DEPTH = 64
+    
+    # shelve is not safe for concurrent access
+    _cache_lock = threading.Lock()
+    
+    @staticmethod
+    def cache_key(*parts) -> str:
+        """Build a cache key such as 'ethereum:0xabc...:txlist'"""
+        return ':'.join(str(part) for part in parts)
+    
+    def load_cached(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None"""
+        if not self.FETCH_CACHE_FILE:
+            return None
+        with self._cache_lock:
+            try:
+                with shelve.open(self.FETCH_CACHE_FILE) as cache:
+                    return cache.get(key)
+            except Exception as e:
+                print(f"Warning: Could not read fetch cache: {e}")
+                return None
+    
+    def store_cached(self, key: str, value: Any):
+        """Persist value under key"""
+        if not self.FETCH_CACHE_FILE:
+            return
+        with self._cache_lock:
+            try:
+                with shelve.open(self.FETCH_CACHE_FILE) as cache:
+                    cache[key] = value
+            except Exception as e:
+                print(f"Warning: Could not write fetch cache: {e}")
 
 
 class BlockchainTradeParser(ABC):
@@ -64,6 +251,31 @@ class BlockchainTradeParser(ABC):
         pass
 
 
+@lru_cache(maxsize=None)
+def _load_class(module_name: str, class_name: str) -> type:
+    """Import `module_name` once and return its `class_name` attribute"""
+    return getattr(import_module(module_name), class_name)
+
+
+# EVM chains share the Etherscan-compatible fetcher/parser
+_EVM_CHAINS = ('ethereum', 'monad', 'arbitrum', 'linea', 'optimism',
+               'polygon', 'katana', 'binance', 'base', 'avax')
+
+# chain name -> (module, class) of the chain's implementation
+_FETCHER_CLASSES = {
+    **{chain: ('fetch_ethereum_transactions', 'EthereumTransactionFetcher') for chain in _EVM_CHAINS},
+    'solana': ('fetch_solana_transactions', 'SolanaTransactionFetcher'),
+    'sui': ('fetch_sui_transactions', 'SuiTransactionFetcher'),
+}
+
+_PARSER_CLASSES = {
+    **{chain: ('parse_ethereum_trades', 'EthereumTradeParser') for chain in _EVM_CHAINS},
+    'solana': ('parse_solana_trades', 'SolanaTradeParser'),
+    'sui': ('parse_sui_trades', 'SuiTradeParser'),
+}
+
+
+@lru_cache(maxsize=None)
 def get_fetcher_class(chain_name: str) -> type:
     """
     Factory function to get the appropriate fetcher class for a chain
@@ -75,27 +287,13 @@ def get_fetcher_class(chain_name: str) -> type:
         Fetcher class for the chain
     """
     chain_name = chain_name.lower()
-    
-    # EVM chains use EthereumTransactionFetcher
-    evm_chains = ['ethereum', 'monad', 'arbitrum', 'linea', 'optimism', 
-                  'polygon', 'katana', 'binance', 'base', 'avax']
-    
-    if chain_name in evm_chains:
-        from fetch_ethereum_transactions import EthereumTransactionFetcher
-        return EthereumTransactionFetcher
-    
-    elif chain_name == 'solana':
-        from fetch_solana_transactions import SolanaTransactionFetcher
-        return SolanaTransactionFetcher
-    
-    elif chain_name == 'sui':
-        from fetch_sui_transactions import SuiTransactionFetcher
-        return SuiTransactionFetcher
-    
-    else:
+    target = _FETCHER_CLASSES.get(chain_name)
+    if target is None:
         raise ValueError(f"Unsupported chain: {chain_name}")
+    return _load_class(*target)
 
 
+@lru_cache(maxsize=None)
 def get_parser_class(chain_name: str) -> type:
     """
     Factory function to get the appropriate parser class for a chain
@@ -107,23 +305,7 @@ def get_parser_class(chain_name: str) -> type:
         Parser class for the chain
     """
     chain_name = chain_name.lower()
-    
-    # EVM chains use EthereumTradeParser
-    evm_chains = ['ethereum', 'monad', 'arbitrum', 'linea', 'optimism', 
-                  'polygon', 'katana', 'binance', 'base', 'avax']
-    
-    if chain_name in evm_chains:
-        from parse_ethereum_trades import EthereumTradeParser
-        return EthereumTradeParser
-    
-    elif chain_name == 'solana':
-        from parse_solana_trades import SolanaTradeParser
-        return SolanaTradeParser
-    
-    elif chain_name == 'sui':
-        from parse_sui_trades import SuiTradeParser
-        return SuiTradeParser
-    
-    else:
+    target = _PARSER_CLASSES.get(chain_name)
+    if target is None:
         raise ValueError(f"Unsupported chain: {chain_name}")
-
+    return _load_class(*target)
@@ -5,80 +5,222 @@ Calculates capital gains/losses using FIFO method for DEX trades
 """
 
 import csv
+import os
 import sys
+from bisect import bisect_left
 from datetime import datetime
-from collections import defaultdict
-from decimal import Decimal, ROUND_DOWN
+from collections import defaultdict, namedtuple
+from operator import attrgetter, itemgetter
+from decimal import Decimal, Context, ROUND_DOWN
+from multiprocessing import Pool
 
+# Fixed-point scales: token amounts in 1e-18 units (like wei), USD in 1e-8
+AMOUNT_SCALE = 10 ** 18
+USD_SCALE = 10 ** 8
 
-class Lot:
-    """Represents a lot of tokens in inventory"""
-    def __init__(self, trade_id, amount, cost_basis_usd, acquisition_date, token_symbol):
-        self.trade_id = trade_id
-        self.amount = Decimal(str(amount))
-        self.cost_basis_usd = Decimal(str(cost_basis_usd))
-        self.acquisition_date = acquisition_date
-        self.token_symbol = token_symbol
-        self.cost_per_token = self.cost_basis_usd / self.amount if self.amount > 0 else Decimal('0')
+# Output precision (decimal places)
+AMOUNT_PLACES = 8
+USD_PLACES = 2
+
+# One row per SELL (fixed-point values, formatted on export)
+TaxRecord = namedtuple('TaxRecord', [
+    'trade_id', 'date_time', 'token_sold', 'amount_sold', 'sale_proceeds_usd',
+    'cost_basis_usd', 'profit_usd', 'buy_tx_ids', 'platform', 'address',
+])
+
+# One row per BUY or SELL kept for the full export
+TradeRecord = namedtuple('TradeRecord', [
+    'trade_id', 'type', 'token', 'amount', 'usd_value', 'date', 'date_time',
+    'platform', 'address',
+])
+
+# Input columns read from the trades CSV, in unpacking order
+TRADE_COLUMNS = (
+    'date_time', 'source_currency', 'source_amount', 'target_currency',
+    'target_amount', 'platform', 'address',
+)
+
+# Consumed lots are dropped once they make up half of a token's columns
+COMPACT_MIN_LOTS = 1024
+
+# Wide enough that scaling never rounds before truncation
+_FIXED_CONTEXT = Context(prec=80, rounding=ROUND_DOWN)
+
+
+def _D(value):
+    """Coerce to Decimal without a str() round-trip unless the value is a float"""
+    if isinstance(value, Decimal):
+        return value
+    if isinstance(value, float):
+        return Decimal(str(value))
+    return Decimal(value)
+
+
+def to_fixed(value, scale):
+    """Convert a decimal string/number to a fixed-point int (truncating)"""
+    scaled = _FIXED_CONTEXT.multiply(_D(value), scale)
+    return int(scaled.to_integral_value(rounding=ROUND_DOWN))
+
+
+def truncate_fixed(value, scale, unit):
+    """Re-scale a fixed-point int from `scale` to the coarser `unit`, truncating toward zero"""
+    step = scale // unit
+    return value // step if value >= 0 else -(-value // step)
+
+
+def format_fixed(value, scale, places):
+    """Format a fixed-point int with `places` decimals (ROUND_DOWN), using int math only"""
+    unit = 10 ** places
+    whole, frac = divmod(abs(truncate_fixed(value, scale, unit)), unit)
+    sign = '-' if value < 0 else ''
+    return f"{sign}{whole}.{frac:0{places}d}"
+
+
+class TokenInventory:
+    """
+    FIFO inventory for a single token, stored column-wise.
+    Amounts are fixed-point ints in AMOUNT_SCALE units, costs in USD_SCALE.
+
+    Lots are not popped per sell: ``head`` points at the oldest lot that
+    still has a balance, and running totals of amount and cost let a sell
+    find the last lot it touches with a binary search. Consumed lots are
+    dropped in bulk once they dominate the columns (amortised O(1)).
+    """
+    def __init__(self):
+        self.amounts = []
+        self.costs = []
+        self.trade_ids = []
+        self.acquisition_dates = []
+        # cum_amounts[i] == sum(amounts[:i + 1]), same for cum_costs
+        self.cum_amounts = []
+        self.cum_costs = []
+        self.head = 0
+        # Totals already sold out of this inventory (may end inside lot `head`)
+        self.consumed_amount = 0
+        self.consumed_cost = 0
+    
+    def __len__(self):
+        return len(self.amounts) - self.head
+    
+    def add(self, trade_id, amount, cost_basis_usd, acquisition_date):
+        """Append a lot at the back of the queue"""
+        total_amount = self.cum_amounts[-1] if self.cum_amounts else 0
+        total_cost = self.cum_costs[-1] if self.cum_costs else 0
+        self.amounts.append(amount)
+        self.costs.append(cost_basis_usd)
+        self.trade_ids.append(trade_id)
+        self.acquisition_dates.append(acquisition_date)
+        self.cum_amounts.append(total_amount + amount)
+        self.cum_costs.append(total_cost + cost_basis_usd)
+    
+    def consume(self, amount):
+        """
+        Remove `amount` tokens from the front of the queue
+        Returns: (cost_basis, matched_trade_ids, amount_not_covered)
+        """
+        head = self.head
+        (self.head, matched_end, cost, self.consumed_amount,
+         self.consumed_cost, uncovered) = _match_fifo(
+            self.cum_amounts, self.cum_costs, head,
+            self.consumed_amount, self.consumed_cost, amount
+        )
+        matched_trade_ids = self.trade_ids[head:matched_end]
+        if self.head >= COMPACT_MIN_LOTS and 2 * self.head >= len(self.amounts):
+            self._compact()
+        return cost, matched_trade_ids, uncovered
+    
+    def _compact(self):
+        """
+        Drop fully consumed lots so the columns don't grow without bound,
+        rebasing the running totals on what has been consumed so far
+        """
+        head = self.head
+        base_amount = self.consumed_amount
+        base_cost = self.consumed_cost
+        del self.amounts[:head]
+        del self.costs[:head]
+        del self.trade_ids[:head]
+        del self.acquisition_dates[:head]
+        self.cum_amounts = [total - base_amount for total in self.cum_amounts[head:]]
+        self.cum_costs = [total - base_cost for total in self.cum_costs[head:]]
+        self.consumed_amount = 0
+        self.consumed_cost = 0
+        self.head = 0
+
+
+def _match_fifo(cum_amounts, cum_costs, head, consumed_amount, consumed_cost, amount):
+    """
+    FIFO matching kernel over running totals (pure function, ints only)
+    Returns: (new_head, matched_end, cost_basis, new_consumed_amount,
+              new_consumed_cost, amount_not_covered)
+    Lots head..matched_end-1 contributed to the sell.
+    """
+    target = consumed_amount + amount
+    # First lot whose running total reaches the target
+    k = bisect_left(cum_amounts, target, lo=head)
+    
+    if k == len(cum_amounts):
+        # Inventory exhausted
+        cost = cum_costs[-1] - consumed_cost
+        uncovered = target - cum_amounts[-1]
+        return k, k, cost, cum_amounts[-1], cum_costs[-1], uncovered
+    
+    # Lots head..k-1 are consumed entirely; lot k (possibly the partially
+    # sold head lot) covers the rest
+    before_amount = cum_amounts[k - 1] if k > 0 else 0
+    before_cost = cum_costs[k - 1] if k > 0 else 0
+    start_amount = max(before_amount, consumed_amount)
+    start_cost = max(before_cost, consumed_cost)
+    
+    lot_amount = cum_amounts[k] - start_amount
+    lot_cost = cum_costs[k] - start_cost
+    taken = target - start_amount
+    
+    if taken == lot_amount:
+        cost_from_lot = lot_cost
+        new_head = k + 1
+    else:
+        cost_from_lot = lot_cost * taken // lot_amount
+        new_head = k
+    
+    cost = (start_cost - consumed_cost) + cost_from_lot
+    return new_head, k + 1, cost, target, start_cost + cost_from_lot, 0
 
 
 class FIFOTaxCalculator:
     """FIFO-based tax calculator for crypto trades"""
     
     def __init__(self):
-        # Inventory: token_symbol -> list of Lot objects (FIFO order)
-        self.inventory = defaultdict(list)
+        # Inventory: token_symbol -> TokenInventory (FIFO order)
+        self.inventory = defaultdict(TokenInventory)
         # Track all trades with IDs
         self.all_trades = []
         self.next_trade_id = 1
     
     def add_lot(self, token_symbol, amount, cost_basis_usd, trade_id, acquisition_date):
-        """Add a lot to inventory"""
-        lot = Lot(trade_id, amount, cost_basis_usd, acquisition_date, token_symbol)
-        self.inventory[token_symbol].append(lot)
+        """Add a lot to inventory (amount and cost basis in fixed-point units)"""
+        self.inventory[token_symbol].add(trade_id, amount, cost_basis_usd, acquisition_date)
     
-    def match_sell_fifo(self, token_symbol, amount_to_sell, sale_price_per_token):
+    def match_sell_fifo(self, token_symbol, amount_to_sell, sale_proceeds):
         """
         Match a sell against inventory using FIFO
+        All values are fixed-point ints (amount in AMOUNT_SCALE, USD in USD_SCALE)
         Returns: (total_cost_basis, matched_trade_ids)
         """
-        if token_symbol not in self.inventory or len(self.inventory[token_symbol]) == 0:
+        inventory = self.inventory.get(token_symbol)
+        if inventory is None or len(inventory) == 0:
             # No inventory - assume cost basis equals sale price (zero gain)
-            total_cost = Decimal(str(amount_to_sell)) * Decimal(str(sale_price_per_token))
-            return total_cost, []
+            return sale_proceeds, []
         
-        amount_remaining = Decimal(str(amount_to_sell))
-        total_cost_basis = Decimal('0')
-        matched_trade_ids = []
-        
-        lots = self.inventory[token_symbol]
+        if amount_to_sell <= 0:
+            return 0, []
         
         # Process lots in FIFO order (oldest first)
-        while amount_remaining > 0 and lots:
-            lot = lots[0]  # Oldest lot
-            
-            if lot.amount <= amount_remaining:
-                # Consume entire lot
-                total_cost_basis += lot.cost_basis_usd
-                matched_trade_ids.append(lot.trade_id)
-                amount_remaining -= lot.amount
-                lots.pop(0)  # Remove consumed lot
-            else:
-                # Partially consume lot
-                fraction = amount_remaining / lot.amount
-                cost_from_lot = lot.cost_basis_usd * fraction
-                total_cost_basis += cost_from_lot
-                matched_trade_ids.append(lot.trade_id)
-                
-                # Update lot with remaining amount
-                lot.amount -= amount_remaining
-                lot.cost_basis_usd -= cost_from_lot
-                amount_remaining = Decimal('0')
+        total_cost_basis, matched_trade_ids, amount_remaining = inventory.consume(amount_to_sell)
         
         # If we still have remaining amount, assume cost basis = sale price for that portion
         if amount_remaining > 0:
-            remaining_cost = amount_remaining * Decimal(str(sale_price_per_token))
-            total_cost_basis += remaining_cost
+            total_cost_basis += sale_proceeds * amount_remaining // amount_to_sell
             # No trade ID for assumed purchases
         
         return total_cost_basis, matched_trade_ids
@@ -87,28 +229,36 @@ class FIFOTaxCalculator:
         """Process trades from CSV and calculate taxes"""
         tax_records = []
         
-        with open(trades_file, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f, delimiter='\t')
+        with open(trades_file, 'r', encoding='utf-8', newline='') as f:
+            # Plain csv.reader + positional getter: no dict allocated per row
+            reader = csv.reader(f, delimiter='\t')
+            header = next(reader, None)
+            if header is None:
+                return tax_records
+            get_columns = itemgetter(*(header.index(column) for column in TRADE_COLUMNS))
             
-            for row in reader:
+            for fields in reader:
+                if not fields:
+                    continue
                 trade_id = self.next_trade_id
                 self.next_trade_id += 1
                 
-                date_time = row['date_time']
-                source_currency = row['source_currency']
-                source_amount_str = row['source_amount']
-                target_currency = row['target_currency']
-                target_amount_str = row['target_amount']
-                platform = row['platform']
-                address = row['address']
+                (date_time, source_currency, source_amount_str, target_currency,
+                 target_amount_str, platform, address) = get_columns(fields)
                 
                 # Skip rows with N/A values
                 if target_amount_str == 'N/A' or source_amount_str == 'N/A':
                     continue
                 
+                # Identify BUY vs SELL up front so rows that are neither
+                # (token -> token swaps) skip amount and date parsing
+                is_sell = target_currency == 'USD'
+                if not is_sell and source_currency != 'USD':
+                    continue
+                
                 try:
-                    source_amount = Decimal(str(source_amount_str))
-                    target_amount = Decimal(str(target_amount_str))
+                    source_amount_dec = _D(source_amount_str)
+                    target_amount_dec = _D(target_amount_str)
                 except (ValueError, TypeError) as e:
                     print(f"Warning: Could not parse amounts for trade {self.next_trade_id}: {e}")
                     continue
@@ -120,74 +270,48 @@ class FIFOTaxCalculator:
                     print(f"Warning: Could not parse date '{date_time}', skipping trade {trade_id}")
                     continue
                 
-                # Identify BUY vs SELL
-                if target_currency == 'USD':
+                if is_sell:
                     # SELL transaction: source_token -> USD
-                    sale_proceeds = target_amount
-                    token_sold = source_currency
-                    amount_sold = source_amount
-                    
-                    if sale_proceeds > 0:
-                        sale_price_per_token = sale_proceeds / amount_sold
-                    else:
-                        sale_price_per_token = Decimal('0')
+                    sale_proceeds = to_fixed(target_amount_dec, USD_SCALE)
+                    # Interned so inventory lookups hit the identity fast path
+                    token_sold = sys.intern(source_currency)
+                    amount_sold = to_fixed(source_amount_dec, AMOUNT_SCALE)
                     
                     # Match against inventory using FIFO
                     cost_basis, buy_tx_ids = self.match_sell_fifo(
-                        token_sold, amount_sold, sale_price_per_token
+                        token_sold, amount_sold, sale_proceeds
                     )
                     
                     profit = sale_proceeds - cost_basis
                     
-                    # Create tax record
-                    tax_record = {
-                        'trade_id': trade_id,
-                        'date_time': date_time,
-                        'token_sold': token_sold,
-                        'amount_sold': str(amount_sold.quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)),
-                        'sale_proceeds_usd': str(sale_proceeds.quantize(Decimal('0.01'), rounding=ROUND_DOWN)),
-                        'cost_basis_usd': str(cost_basis.quantize(Decimal('0.01'), rounding=ROUND_DOWN)),
-                        'profit_usd': str(profit.quantize(Decimal('0.01'), rounding=ROUND_DOWN)),
-                        'buy_tx_ids': ','.join(map(str, buy_tx_ids)) if buy_tx_ids else '',
-                        'platform': platform,
-                        'address': address,
-                    }
-                    tax_records.append(tax_record)
+                    # Create tax record (fixed-point values, formatted on export)
+                    tax_records.append(TaxRecord(
+                        trade_id, date_time, token_sold, amount_sold,
+                        sale_proceeds, cost_basis, profit,
+                        ','.join(map(str, buy_tx_ids)) if buy_tx_ids else '',
+                        platform, address,
+                    ))
                     
                     # Store trade info with full details for CSV export
-                    self.all_trades.append({
-                        'trade_id': trade_id,
-                        'type': 'SELL',
-                        'token': token_sold,
-                        'amount': amount_sold,
-                        'usd_value': sale_proceeds,
-                        'date': trade_date,
-                        'date_time': date_time,
-                        'platform': platform,
-                        'address': address,
-                    })
+                    self.all_trades.append(TradeRecord(
+                        trade_id, 'SELL', token_sold, amount_sold, sale_proceeds,
+                        trade_date, date_time, platform, address,
+                    ))
                 
-                elif source_currency == 'USD':
+                else:
                     # BUY transaction: USD -> target_token
-                    cost_basis = source_amount
-                    token_bought = target_currency
-                    amount_bought = target_amount
+                    cost_basis = to_fixed(source_amount_dec, USD_SCALE)
+                    token_bought = sys.intern(target_currency)
+                    amount_bought = to_fixed(target_amount_dec, AMOUNT_SCALE)
                     
                     # Add to inventory
                     self.add_lot(token_bought, amount_bought, cost_basis, trade_id, trade_date)
                     
                     # Store trade info with full details for CSV export
-                    self.all_trades.append({
-                        'trade_id': trade_id,
-                        'type': 'BUY',
-                        'token': token_bought,
-                        'amount': amount_bought,
-                        'usd_value': cost_basis,
-                        'date': trade_date,
-                        'date_time': date_time,
-                        'platform': platform,
-                        'address': address,
-                    })
+                    self.all_trades.append(TradeRecord(
+                        trade_id, 'BUY', token_bought, amount_bought, cost_basis,
+                        trade_date, date_time, platform, address,
+                    ))
         
         return tax_records
     
@@ -205,58 +329,62 @@ class FIFOTaxCalculator:
         ]
         
         # Create a mapping of trade_id to tax_record for SELL transactions
-        tax_records_by_id = {int(r['trade_id']): r for r in tax_records}
+        tax_records_by_id = {r.trade_id: r for r in tax_records}
         
-        # Prepare all records (both BUY and SELL)
-        all_records = []
+        # Prepare all records (both BUY and SELL) as row tuples in fieldnames
+        # order, most recent first. Sort on the parsed datetime rather than
+        # the formatted string.
+        all_rows = []
+        buy_count = 0
+        sell_count = 0
+        empty_sell_columns = ('', '', '', '', '', '')
         
-        for trade in self.all_trades:
-            trade_id = trade['trade_id']
-            record = {
-                'trade_id': trade_id,
-                'date_time': trade['date_time'],
-                'type': trade['type'],
-                'token': trade['token'],
-                'amount': str(trade['amount'].quantize(Decimal('0.00000001'), rounding=ROUND_DOWN)),
-                'usd_value': str(trade['usd_value'].quantize(Decimal('0.01'), rounding=ROUND_DOWN)),
-                'token_sold': '',
-                'amount_sold': '',
-                'sale_proceeds_usd': '',
-                'cost_basis_usd': '',
-                'profit_usd': '',
-                'buy_tx_ids': '',
-                'platform': trade['platform'],
-                'address': trade['address'],
-            }
+        for trade in sorted(self.all_trades, key=attrgetter('date'), reverse=True):
+            trade_id = trade.trade_id
+            if trade.type == 'BUY':
+                buy_count += 1
+            elif trade.type == 'SELL':
+                sell_count += 1
             
             # If this is a SELL transaction, add tax record details
-            if trade['type'] == 'SELL' and trade_id in tax_records_by_id:
-                tax_record = tax_records_by_id[trade_id]
-                record['token_sold'] = tax_record['token_sold']
-                record['amount_sold'] = tax_record['amount_sold']
-                record['sale_proceeds_usd'] = tax_record['sale_proceeds_usd']
-                record['cost_basis_usd'] = tax_record['cost_basis_usd']
-                record['profit_usd'] = tax_record['profit_usd']
-                record['buy_tx_ids'] = tax_record['buy_tx_ids']
+            tax_record = tax_records_by_id.get(trade_id) if trade.type == 'SELL' else None
+            if tax_record is not None:
+                sell_columns = (
+                    tax_record.token_sold,
+                    format_fixed(tax_record.amount_sold, AMOUNT_SCALE, AMOUNT_PLACES),
+                    format_fixed(tax_record.sale_proceeds_usd, USD_SCALE, USD_PLACES),
+                    format_fixed(tax_record.cost_basis_usd, USD_SCALE, USD_PLACES),
+                    format_fixed(tax_record.profit_usd, USD_SCALE, USD_PLACES),
+                    tax_record.buy_tx_ids,
+                )
+            else:
+                sell_columns = empty_sell_columns
             
-            all_records.append(record)
+            all_rows.append((
+                trade_id,
+                trade.date_time,
+                trade.type,
+                trade.token,
+                format_fixed(trade.amount, AMOUNT_SCALE, AMOUNT_PLACES),
+                format_fixed(trade.usd_value, USD_SCALE, USD_PLACES),
+                *sell_columns,
+                trade.platform,
+                trade.address,
+            ))
         
         with open(output_file, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter='\t')
-            writer.writeheader()
-            
-            # Sort by date (most recent first)
-            sorted_records = sorted(all_records, key=lambda x: x['date_time'], reverse=True)
-            writer.writerows(sorted_records)
+            writer = csv.writer(f, delimiter='\t')
+            writer.writerow(fieldnames)
+            writer.writerows(all_rows)
         
-        buy_count = sum(1 for r in all_records if r['type'] == 'BUY')
-        sell_count = sum(1 for r in all_records if r['type'] == 'SELL')
-        print(f"✓ Exported {len(all_records)} records ({buy_count} BUY, {sell_count} SELL) to {output_file}")
+        print(f"✓ Exported {len(all_rows)} records ({buy_count} BUY, {sell_count} SELL) to {output_file}")
         
         # Print summary (only from tax_records, not all_records)
-        total_profit = sum(Decimal(r['profit_usd']) for r in tax_records)
-        total_sales = sum(Decimal(r['sale_proceeds_usd']) for r in tax_records)
-        total_cost = sum(Decimal(r['cost_basis_usd']) for r in tax_records)
+        # Sum the per-record cent values as printed in the CSV
+        cents = 10 ** USD_PLACES
+        total_profit = Decimal(sum(truncate_fixed(r.profit_usd, USD_SCALE, cents) for r in tax_records)) / cents
+        total_sales = Decimal(sum(truncate_fixed(r.sale_proceeds_usd, USD_SCALE, cents) for r in tax_records)) / cents
+        total_cost = Decimal(sum(truncate_fixed(r.cost_basis_usd, USD_SCALE, cents) for r in tax_records)) / cents
         
         print(f"\nTax Summary:")
         print(f"  Total sales: ${total_sales:,.2f}")
@@ -264,27 +392,11 @@ class FIFOTaxCalculator:
         print(f"  Total capital gain/loss: ${total_profit:,.2f}")
 
 
-def main():
-    """Main function"""
-    input_csv = "evm_trades.csv"
-    output_csv = "tax_calculations.csv"
-    
-    if len(sys.argv) > 1:
-        input_csv = sys.argv[1]
-    if len(sys.argv) > 2:
-        output_csv = sys.argv[2]
-    
-    print("=" * 80)
-    print("FIFO Capital Gains Tax Calculator")
-    print("=" * 80)
-    print(f"Input file: {input_csv}")
-    print(f"Output file: {output_csv}")
-    print("=" * 80)
-    print()
-    
+def process_one_wallet(input_csv, output_csv):
+    """Run the FIFO calculation for one trades file (one wallet)"""
     calculator = FIFOTaxCalculator()
     
-    print("Processing trades...")
+    print(f"Processing trades from {input_csv}...")
     tax_records = calculator.process_trades(input_csv)
     
     print(f"✓ Processed {len(tax_records)} sell transactions")
@@ -292,6 +404,43 @@ def main():
     
     print("Exporting tax calculations...")
     calculator.export_tax_csv(tax_records, output_csv)
+    return len(tax_records)
+
+
+def main():
+    """
+    Main function
+    Usage: calculate_fifo_taxes.py [input_csv [output_csv [input_csv output_csv ...]]]
+    Several input/output pairs are processed in parallel, one process per wallet.
+    """
+    args = sys.argv[1:]
+    
+    if len(args) <= 2:
+        tasks = [(
+            args[0] if len(args) > 0 else "evm_trades.csv",
+            args[1] if len(args) > 1 else "tax_calculations.csv",
+        )]
+    elif len(args) % 2 == 0:
+        tasks = list(zip(args[0::2], args[1::2]))
+    else:
+        print("Usage: python calculate_fifo_taxes.py [input_csv [output_csv [input_csv output_csv ...]]]")
+        sys.exit(1)
+    
+    print("=" * 80)
+    print("FIFO Capital Gains Tax Calculator")
+    print("=" * 80)
+    for input_csv, output_csv in tasks:
+        print(f"Input file: {input_csv}")
+        print(f"Output file: {output_csv}")
+    print("=" * 80)
+    print()
+    
+    if len(tasks) == 1:
+        process_one_wallet(*tasks[0])
+    else:
+        # Wallets are independent; the work is pure Python, so use processes
+        with Pool(processes=min(len(tasks), os.cpu_count() or 1)) as pool:
+            pool.starmap(process_one_wallet, tasks)
     
     print()
     print("=" * 80)
@@ -301,4 +450,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
@@ -4,29 +4,42 @@ Calculate USD prices for all trades
 Uses multiple strategies to ensure tax services have USD valuations
 """
 
-import json
+import bisect
+import calendar
+import orjson
 import requests
 import time
 import os
+import re
+import sys
 from typing import Dict, List, Optional, Tuple
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict, namedtuple
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 
 # CoinGecko integration
 from coingecko import (
-    refresh_symbol_mapping,
-    load_symbol_mapping,
-    get_historical_price,
-    get_cache_key,
+    get_symbol_mapping,
+    query_coingecko_history,
+    query_coingecko_range,
+    get_cache_date,
     DEFAULT_MAPPING_FILE,
     DEFAULT_CACHE_FILE
 )
 
+# A range price point counts for a day if it is within this long of 00:00 UTC
+RANGE_POINT_TOLERANCE = 3600
+
+# Concurrent CoinGecko prefetch requests (still spaced by the coingecko rate limiter)
+PREFETCH_WORKERS = 4
+
 # Stablecoins - extended list for cache window optimization and fallback pricing
 # We get actual prices from CoinGecko, but use this list to:
 # 1. Apply longer cache window (5 min vs 1 min) for stablecoins
 # 2. Fallback to $1.00 if CoinGecko fails for a stablecoin
-STABLECOINS = {
+# Entries are uppercase; callers compare against uppercased symbols
+STABLECOINS = frozenset({
     # Major USD stablecoins
     'USDC', 'USDT', 'DAI', 'BUSD', 'USDP', 'TUSD', 'USDD', 'FRAX', 'LUSD', 
     'GUSD', 'HUSD', 'SUSD', 'MIM', 'OUSD', 'FEI', 'USD3', 'NUSD', 'AUSD', 'USN',
@@ -65,7 +78,28 @@ STABLECOINS = {
     'XPLN',      # Polish Zloty Token
     'XSEK',      # Swedish Krona Token
     'XSGD',      # Singapore Dollar Token
-}
+})
+
+
+# Protocol tokens priced through their underlying asset: Pendle PT-ASSET-<expiry
+# date> and Aave v3 market tokens (aEthASSET, aArbASSET, ...). Bare a/f prefixes
+# are left out: spam such as fUSDC would be priced as USDC. Exactly one named
+# group matches. Not memoized: pricing_symbol already resolves each symbol once.
+_UNDERLYING_RE = re.compile(r'PT-(?P<pendle>[^-]+)-\d{1,2}[A-Z]{3}\d{4}|a(?:Eth|Arb|Bas|Opt|Pol|Ava)(?P<aave>.+)')
+
+
+# The fields of a trade that pricing reads, parsed once per trade (symbols are
+# the uppercase symbols each token is priced as; amounts stay unparsed strings
+# until a swap ratio is actually needed)
+TradeView = namedtuple('TradeView', [
+    'source_symbol', 'target_symbol', 'source_amount', 'target_amount', 'timestamp',
+])
+
+
+@lru_cache(maxsize=None)
+def _utc_day_start(date_str: str) -> int:
+    """00:00 UTC of a YYYY-MM-DD date, the instant CoinGecko /history prices"""
+    return calendar.timegm(time.strptime(date_str, '%Y-%m-%d'))
 
 
 class PriceFeedBuilder:
@@ -74,9 +108,12 @@ class PriceFeedBuilder:
     CACHE_FILE = DEFAULT_CACHE_FILE
     MAPPING_FILE = DEFAULT_MAPPING_FILE
     
-    def __init__(self):
-        self.symbol_mapping = refresh_symbol_mapping(self.MAPPING_FILE)  # {symbol: coin_id} - refreshed on every flow start
-        self.price_cache = self._load_price_cache()  # {symbol: {'price': float, 'timestamp': int}}
+    def __init__(self, force_refresh: bool = False):
+        # {symbol: coin_id} - refreshed once a day, or on every start with force_refresh
+        self.symbol_mapping = get_symbol_mapping(self.MAPPING_FILE, force_refresh)
+        self.price_cache = self._load_price_cache()  # {SYMBOL_YYYY-MM-DD: price or None (no price that day)}
+        self._price_cache_dirty = False  # price_cache has entries not yet saved
+        self._pricing_symbols = {}  # {token symbol: uppercase symbol it is priced as}
         
     def is_stablecoin(self, symbol: str) -> bool:
         """Check if token is a stablecoin"""
@@ -86,8 +123,8 @@ class PriceFeedBuilder:
         """Load price cache from file"""
         if os.path.exists(self.CACHE_FILE):
             try:
-                with open(self.CACHE_FILE, 'r') as f:
-                    return json.load(f)
+                with open(self.CACHE_FILE, 'rb') as f:
+                    return orjson.loads(f.read())
             except Exception:
                 return {}
         return {}
@@ -95,64 +132,182 @@ class PriceFeedBuilder:
     def _save_price_cache(self):
         """Save price cache to file"""
         try:
-            with open(self.CACHE_FILE, 'w') as f:
-                json.dump(self.price_cache, f, indent=2)
+            # Compact: the cache is rewritten often and never read by hand
+            with open(self.CACHE_FILE, 'wb') as f:
+                f.write(orjson.dumps(self.price_cache))
         except Exception:
             pass  # Silently fail if can't save cache
     
-    def _get_cache_key(self, symbol: str, timestamp: int) -> str:
-        """Generate cache key for historical price: symbol_date"""
-        return get_cache_key(symbol, timestamp)
+    def flush_price_cache(self):
+        """Save the price cache if it changed since the last save"""
+        if self._price_cache_dirty:
+            self._save_price_cache()
+            self._price_cache_dirty = False
+    
+    def _get_cache_key(self, symbol_upper: str, timestamp: int) -> str:
+        """Generate cache key for historical price: symbol_date (symbol already uppercase)"""
+        return f"{symbol_upper}_{get_cache_date(timestamp)}"
     
     def get_coingecko_price(self, symbol: str, timestamp: int) -> Optional[float]:
-        """Get historical price from CoinGecko with file-based caching by date"""
-        symbol_upper = symbol.upper()
+        """
+        Get historical price from CoinGecko with file-based caching by date
+        Days CoinGecko has no price for are cached as None so they are not
+        re-queried; rate limits and errors are not cached.
+        """
+        return self._get_coingecko_price_upper(self.pricing_symbol(symbol), timestamp)
+    
+    def pricing_symbol(self, symbol: str) -> str:
+        """
+        Uppercase symbol a token is priced as: the symbol itself, or for a
+        known protocol token CoinGecko doesn't list, its underlying asset
+        (aEthUSDC -> USDC, PT-iUSD-4DEC2025 -> IUSD) if CoinGecko lists that
+        """
+        resolved = self._pricing_symbols.get(symbol)
+        if resolved is None:
+            resolved = symbol.upper()
+            if resolved not in self.symbol_mapping:
+                # Prefixes are case-sensitive, so match on the original symbol
+                underlying = self.extract_underlying_asset(symbol)
+                if underlying and underlying.upper() in self.symbol_mapping:
+                    resolved = underlying.upper()
+            # Interned: every trade of a token shares one symbol string
+            resolved = self._pricing_symbols[symbol] = sys.intern(resolved)
+        return resolved
+    
+    def parse_trade_view(self, trade: Dict) -> TradeView:
+        """Extract the pricing fields of an enriched trade"""
+        return TradeView(
+            self.pricing_symbol(trade.get('token_in_metadata', {}).get('symbol', '')),
+            self.pricing_symbol(trade.get('token_out_metadata', {}).get('symbol', '')),
+            trade.get('amount_in_formatted', '0'),
+            trade.get('amount_out_formatted', '0'),
+            trade.get('timestamp', 0),
+        )
+    
+    def _get_coingecko_price_upper(self, symbol_upper: str, timestamp: int) -> Optional[float]:
+        """get_coingecko_price for a symbol the caller has already uppercased"""
         cache_key = self._get_cache_key(symbol_upper, timestamp)
         
         # Check cache first - same date = same price (no time window needed)
         if cache_key in self.price_cache:
             cached_price = self.price_cache[cache_key]
-            if cached_price is not None:
-                return float(cached_price)
+            return float(cached_price) if cached_price is not None else None
+        
+        coingecko_id = self.symbol_mapping.get(symbol_upper)
+        if not coingecko_id:
+            return None
         
         # Cache miss, query CoinGecko
-        price = get_historical_price(symbol_upper, timestamp, self.symbol_mapping)
+        price, definitive = query_coingecko_history(coingecko_id, timestamp)
         
-        # Update cache if we got a price (cache by date, not timestamp)
-        if price is not None:
+        # Update cache (by date, not timestamp) unless the answer was transient
+        if price is not None or definitive:
             self.price_cache[cache_key] = price
-            self._save_price_cache()
+            self._price_cache_dirty = True
         
         return price
     
+    def prefetch_prices(self, views: List[TradeView]):
+        """
+        Warm the price cache with one /market_chart/range call per coin,
+        spanning all its uncached trade days, instead of one /history call
+        per (symbol, day). Days the range does not cover are then queried
+        via /history concurrently, so the pricing pass only reads the cache.
+        """
+        # coin_id -> {cache_key: a trade timestamp on that day}
+        missing_days = defaultdict(dict)
+        for view in views:
+            timestamp = view.timestamp
+            for symbol_upper in (view.source_symbol, view.target_symbol):
+                coingecko_id = self.symbol_mapping.get(symbol_upper)
+                if not coingecko_id:
+                    continue
+                cache_key = self._get_cache_key(symbol_upper, timestamp)
+                if cache_key not in self.price_cache:
+                    missing_days[coingecko_id][cache_key] = timestamp
+        
+        if not missing_days:
+            return
+        
+        def fetch_range(item):
+            coingecko_id, days = item
+            # Cache keys end in the YYYY-MM-DD date /history is asked for
+            day_starts = {cache_key: _utc_day_start(cache_key[-10:]) for cache_key in days}
+            starts = day_starts.values()
+            # Pad by a day on both sides so the first and last days also have
+            # a neighbour before and after 00:00 to choose from
+            return day_starts, query_coingecko_range(coingecko_id, min(starts) - 86400, max(starts) + 86400)
+        
+        def fetch_day(item):
+            (coingecko_id, _), (timestamp, cache_keys) = item
+            return cache_keys, query_coingecko_history(coingecko_id, timestamp)
+        
+        print(f"Prefetching CoinGecko prices for {len(missing_days)} coins...")
+        # Overlap request latency across coins; the cache is only written here
+        with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+            ranges = list(executor.map(fetch_range, missing_days.items()))
+        
+        filled = 0
+        for days, points in ranges:
+            if not points:
+                continue
+            
+            # Points come back in time order: bisect for the neighbours of
+            # each day's 00:00 UTC and keep the closer one
+            point_times = [point_ts for point_ts, _ in points]
+            for cache_key, day_start in days.items():
+                i = bisect.bisect_left(point_times, day_start)
+                if i < len(point_times) and (i == 0 or point_times[i] - day_start <= day_start - point_times[i - 1]):
+                    nearest = i
+                elif i > 0:
+                    nearest = i - 1
+                else:
+                    continue
+                if abs(point_times[nearest] - day_start) <= RANGE_POINT_TOLERANCE:
+                    self.price_cache[cache_key] = points[nearest][1]
+                    filled += 1
+        
+        # Whatever the ranges did not cover goes to /history, one request per
+        # (coin, date): symbols mapped to the same coin share the answer
+        # (coin_id, date) -> (a trade timestamp on that date, [cache_key, ...])
+        leftover_days = {}
+        for coingecko_id, days in missing_days.items():
+            for cache_key, timestamp in days.items():
+                if cache_key not in self.price_cache:
+                    leftover_days.setdefault((coingecko_id, cache_key[-10:]), (timestamp, []))[1].append(cache_key)
+        if leftover_days:
+            print(f"  Querying {len(leftover_days)} remaining days individually...")
+            with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS) as executor:
+                for cache_keys, (price, definitive) in executor.map(fetch_day, leftover_days.items()):
+                    # Same rule as get_coingecko_price: transient failures are not cached
+                    if price is not None or definitive:
+                        for cache_key in cache_keys:
+                            self.price_cache[cache_key] = price
+                        filled += len(cache_keys)
+        
+        if filled:
+            self._price_cache_dirty = True
+            self.flush_price_cache()
+        print(f"  ✓ Prefetched {filled} coin-days")
+    
     def extract_underlying_asset(self, protocol_token: str) -> Optional[str]:
         """
-        Extract underlying asset from protocol token symbol
+        Extract underlying asset from a known protocol token symbol (Pendle PT, Aave v3)
         Examples:
         - PT-nBASIS-26MAR2026 -> nBASIS
         - PT-iUSD-4DEC2025 -> iUSD
         - aEthUSDC -> USDC
-        - fGHO -> GHO
+        - aArbwstETH -> wstETH
+        Returns None for anything else (fGHO, aXYZ)
         """
-        # Pendle PT tokens: PT-ASSET-DATE -> ASSET
-        if protocol_token.startswith('PT-'):
-            parts = protocol_token.split('-')
-            if len(parts) >= 2:
-                return parts[1]  # Return the asset part
-        
-        # Aave tokens: aEthASSET -> ASSET, aASSET -> ASSET
-        if protocol_token.startswith('aEth'):
-            return protocol_token[4:]  # Remove 'aEth' prefix
-        if protocol_token.startswith('a') and len(protocol_token) > 1:
-            return protocol_token[1:]  # Remove 'a' prefix
-        
-        # Other patterns
-        if protocol_token.startswith('f'):  # fUSDC, fGHO
-            return protocol_token[1:]
-        
-        return None
+        match = _UNDERLYING_RE.fullmatch(protocol_token)
+        return match.group(match.lastgroup) if match else None
     
     def calculate_prices_for_trade(self, trade: Dict) -> Tuple[Optional[float], Optional[float], str]:
+        """Calculate USD prices for an enriched trade dict (see calculate_prices_for_view)"""
+        return self.calculate_prices_for_view(self.parse_trade_view(trade))
+    
+    def calculate_prices_for_view(self, view: TradeView) -> Tuple[Optional[float], Optional[float], str]:
         """
         Calculate USD prices for a trade using CoinGecko as primary source
         Returns: (source_price_usd, target_price_usd, price_source)
@@ -164,24 +319,21 @@ class PriceFeedBuilder:
         3. Stablecoin = $1.00 + swap ratio (last resort if CoinGecko fails for stablecoin)
         4. Unavailable (if no options)
         """
-        token_in_meta = trade.get('token_in_metadata', {})
-        token_out_meta = trade.get('token_out_metadata', {})
-        
-        source_symbol = token_in_meta.get('symbol', '')
-        target_symbol = token_out_meta.get('symbol', '')
-        
-        source_amount = float(trade.get('amount_in_formatted', '0'))
-        target_amount = float(trade.get('amount_out_formatted', '0'))
-        timestamp = trade.get('timestamp', 0)
+        # Symbols are already uppercase; every lookup below is by uppercase symbol
+        source_symbol, target_symbol, source_amount, target_amount, timestamp = view
         
         # Strategy 1: Try CoinGecko for both tokens (primary)
-        source_price = self.get_coingecko_price(source_symbol, timestamp)
-        target_price = self.get_coingecko_price(target_symbol, timestamp)
+        source_price = self._get_coingecko_price_upper(source_symbol, timestamp)
+        target_price = self._get_coingecko_price_upper(target_symbol, timestamp)
         
-        # Case 1: Both found in CoinGecko
+        # Case 1: Both found in CoinGecko (the common case, needs no amounts)
         if source_price and target_price:
             return source_price, target_price, "coingecko"
         
+        # Every other case works from the swap ratio
+        source_amount = float(source_amount)
+        target_amount = float(target_amount)
+        
         # Case 2: Source found, target not found - calculate target from swap ratio
         if source_price and not target_price:
             if source_amount > 0 and target_amount > 0:
@@ -194,37 +346,21 @@ class PriceFeedBuilder:
                 source_price = (target_amount / source_amount) * target_price
                 return source_price, target_price, "coingecko_with_ratio"
         
-        # Case 4: Both not found - check if one is stablecoin
+        # Case 4: Both not found - check if one is stablecoin. CoinGecko was
+        # just asked for both sides (and retried on rate limits), so asking
+        # again for the stablecoin side cannot help: assume $1.00
         if not source_price and not target_price:
-            # Check if source is stablecoin - try CoinGecko specifically for it
             if self.is_stablecoin(source_symbol):
-                source_price = self.get_coingecko_price(source_symbol, timestamp)
-                if source_price:
-                    # Got stablecoin price from CoinGecko, calculate target
-                    if source_amount > 0 and target_amount > 0:
-                        target_price = (source_amount / target_amount) * source_price
-                        return source_price, target_price, "coingecko_with_ratio"
-                else:
-                    # CoinGecko failed for stablecoin, assume $1.00
-                    source_price = 1.0
-                    if source_amount > 0 and target_amount > 0:
-                        target_price = source_amount / target_amount
-                        return source_price, target_price, "stablecoin_ratio"
+                source_price = 1.0
+                if source_amount > 0 and target_amount > 0:
+                    target_price = source_amount / target_amount
+                    return source_price, target_price, "stablecoin_ratio"
             
-            # Check if target is stablecoin - try CoinGecko specifically for it
             elif self.is_stablecoin(target_symbol):
-                target_price = self.get_coingecko_price(target_symbol, timestamp)
-                if target_price:
-                    # Got stablecoin price from CoinGecko, calculate source
-                    if source_amount > 0 and target_amount > 0:
-                        source_price = (target_amount / source_amount) * target_price
-                        return source_price, target_price, "coingecko_with_ratio"
-                else:
-                    # CoinGecko failed for stablecoin, assume $1.00
-                    target_price = 1.0
-                    if source_amount > 0 and target_amount > 0:
-                        source_price = target_amount / source_amount
-                        return source_price, target_price, "stablecoin_ratio"
+                target_price = 1.0
+                if source_amount > 0 and target_amount > 0:
+                    source_price = target_amount / source_amount
+                    return source_price, target_price, "stablecoin_ratio"
             
             # Neither is stablecoin, no prices available
             return None, None, "unavailable"
@@ -233,61 +369,75 @@ class PriceFeedBuilder:
         return None, None, "unavailable"
 
 
-def add_prices_to_trades(enriched_json_file: str, output_json_file: str):
-    """Add USD prices to enriched trades"""
+def add_prices_to_trades(enriched_json_file: str, output_json_file: str, pretty: bool = False,
+                         force_refresh: bool = False):
+    """
+    Add USD prices to enriched trades (output is compact JSON unless pretty=True)
+    force_refresh re-downloads the CoinGecko symbol mapping even if it is recent
+    """
     print("\nCalculating USD prices for all trades...")
     print("-" * 60)
     
     # Load enriched trades
-    with open(enriched_json_file, 'r') as f:
-        data = json.load(f)
+    with open(enriched_json_file, 'rb') as f:
+        data = orjson.loads(f.read())
     
     trades = data.get('trades', [])
     if not trades:
         print("No trades to price")
         return
     
-    price_builder = PriceFeedBuilder()
+    price_builder = PriceFeedBuilder(force_refresh)
+    # Parse each trade once for both the prefetch and the pricing pass
+    views = [price_builder.parse_trade_view(trade) for trade in trades]
+    price_builder.prefetch_prices(views)
     
     # Calculate prices for each trade
     priced_count = 0
     unavailable_count = 0
-    price_sources = defaultdict(int)
+    price_sources = Counter()
     
-    for trade in trades:
-        source_price, target_price, price_source = price_builder.calculate_prices_for_trade(trade)
-        
-        trade['source_price_usd'] = source_price
-        trade['target_price_usd'] = target_price
-        trade['price_source'] = price_source
-        
-        if source_price and target_price:
-            priced_count += 1
-        else:
-            unavailable_count += 1
-        
-        price_sources[price_source] += 1
+    # Prices fetched during the loop are saved once at the end (even if interrupted)
+    try:
+        for trade, view in zip(trades, views):
+            source_price, target_price, price_source = price_builder.calculate_prices_for_view(view)
+            
+            trade['source_price_usd'] = source_price
+            trade['target_price_usd'] = target_price
+            trade['price_source'] = price_source
+            
+            if source_price and target_price:
+                priced_count += 1
+            else:
+                unavailable_count += 1
+            
+            price_sources[price_source] += 1
+    finally:
+        price_builder.flush_price_cache()
     
     # Save updated trades
-    with open(output_json_file, 'w') as f:
-        json.dump(data, f, indent=2)
+    with open(output_json_file, 'wb') as f:
+        f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2 if pretty else 0))
     
     print(f"\nPrice calculation summary:")
     print(f"  ✓ Priced: {priced_count} trades")
     print(f"  ⚠ Unavailable: {unavailable_count} trades")
     print(f"\nPrice sources:")
-    for source, count in sorted(price_sources.items(), key=lambda x: x[1], reverse=True):
+    for source, count in price_sources.most_common():
         print(f"  {source}: {count}")
 
 
 if __name__ == "__main__":
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: python calculate_prices.py <enriched_json_file> [output_json_file]")
+    flags = {'--pretty', '--force-refresh'}
+    pretty = '--pretty' in sys.argv
+    force_refresh = '--force-refresh' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg not in flags]
+    if not args:
+        print("Usage: python calculate_prices.py <enriched_json_file> [output_json_file] [--pretty] [--force-refresh]")
         sys.exit(1)
     
-    input_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else input_file.replace('.json', '_priced.json')
+    input_file = args[0]
+    output_file = args[1] if len(args) > 1 else input_file.replace('.json', '_priced.json')
     
-    add_prices_to_trades(input_file, output_file)
+    add_prices_to_trades(input_file, output_file, pretty=pretty, force_refresh=force_refresh)
 
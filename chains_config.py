@@ -3,12 +3,18 @@ Chain Configuration for Multi-EVM Support
 Defines API endpoints, chain IDs, and chain-specific settings
 """
 
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional
+
 # Supported blockchains
 # EVM chains: ethereum, monad, arbitrum, linea, optimism, polygon, katana, binance, base, avax
 # Non-EVM chains: solana, sui
 SUPPORTED_CHAINS = ['ethereum', 'monad', 'arbitrum', 'linea', 'optimism', 'polygon', 'katana', 'binance', 'base', 'solana', 'sui']
 # SUPPORTED_CHAINS = ['ethereum', 'monad', 'avax', 'base', 'arbitrum', 'binance', 'linea', 'katana', 'polygon', 'optimism']
 
+# Chain list as shown in "not supported" errors
+_SUPPORTED_CHAINS_STR = ', '.join(SUPPORTED_CHAINS)
+
 # Chain configurations
 CHAINS = {
     'ethereum': {
@@ -127,6 +133,32 @@ CHAINS = {
 }
 
 
+# Chain configs keyed by lowercase name, so lookups need a single .get()
+_CHAINS_LC = {name.lower(): config for name, config in CHAINS.items()}
+
+
+class ChainConfig(NamedTuple):
+    """Read-only view of the fields every chain config defines"""
+    name: str
+    api_base: Optional[str]
+    chain_id: Optional[str]
+    native_token: str
+    weth_address: Optional[str]
+    explorer_url: str
+
+
+# One ChainConfig per chain, used by the get_* accessors below
+_CHAIN_RECORDS = {
+    name: ChainConfig(**{field: config[field] for field in ChainConfig._fields})
+    for name, config in _CHAINS_LC.items()
+}
+
+# Chains whose config marks them non-EVM (chain_type defaults to 'evm')
+_NON_EVM_CHAINS = frozenset(
+    name for name, config in _CHAINS_LC.items() if config.get('chain_type', 'evm') != 'evm'
+)
+
+
 def get_chain_config(chain_name: str) -> dict:
     """
     Get configuration for a specific chain
@@ -141,12 +173,13 @@ def get_chain_config(chain_name: str) -> dict:
         ValueError: If chain is not supported
     """
     chain_name = chain_name.lower()
-    if chain_name not in CHAINS:
+    config = _CHAINS_LC.get(chain_name)
+    if config is None:
         raise ValueError(
             f"Chain '{chain_name}' not supported. "
-            f"Supported chains: {', '.join(SUPPORTED_CHAINS)}"
+            f"Supported chains: {_SUPPORTED_CHAINS_STR}"
         )
-    return CHAINS[chain_name]
+    return config
 
 
 def is_evm_chain(chain_name: str) -> bool:
@@ -160,28 +193,37 @@ def is_evm_chain(chain_name: str) -> bool:
         True if EVM-compatible, False otherwise
     """
     chain_name = chain_name.lower()
-    chain_config = get_chain_config(chain_name)
-    return chain_config.get('chain_type', 'evm') == 'evm'
+    if chain_name not in _CHAINS_LC:
+        get_chain_config(chain_name)  # raises ValueError for unsupported chains
+    return chain_name not in _NON_EVM_CHAINS
+
+
+def _chain_record(chain_name: str) -> 'ChainConfig':
+    """Precomputed ChainConfig for a chain (same validation as get_chain_config)"""
+    record = _CHAIN_RECORDS.get(chain_name.lower())
+    if record is None:
+        get_chain_config(chain_name)  # raises ValueError for unsupported chains
+    return record
 
 
 def get_api_base(chain_name: str) -> str:
     """Get API base URL for a chain"""
-    return get_chain_config(chain_name)['api_base']
+    return _chain_record(chain_name).api_base
 
 
 def get_chain_id(chain_name: str) -> str:
     """Get chain ID for a chain"""
-    return get_chain_config(chain_name)['chain_id']
+    return _chain_record(chain_name).chain_id
 
 
 def get_weth_address(chain_name: str) -> str:
     """Get WETH address for a chain"""
-    return get_chain_config(chain_name)['weth_address']
+    return _chain_record(chain_name).weth_address
 
 
 def get_native_token(chain_name: str) -> str:
     """Get native token symbol for a chain"""
-    return get_chain_config(chain_name)['native_token']
+    return _chain_record(chain_name).native_token
 
 
 # DEX Router addresses - chain-specific
@@ -267,7 +309,21 @@ DEX_ROUTERS_BY_CHAIN = {
 }
 
 
-def get_dex_routers(chain_name: str) -> dict:
+# Uniswap V3 is usually available everywhere, so every chain gets it by default
+_DEFAULT_UNISWAP_V3_ROUTER = "0x68b3465833fb72A70ecDF485E0e4C7bD8665Fc45"
+
+# Read-only per-chain router tables, built once with the default added
+_DEX_ROUTERS_FINAL = {
+    chain: MappingProxyType({
+        **routers,
+        'Uniswap V3 Router': routers.get('Uniswap V3 Router', _DEFAULT_UNISWAP_V3_ROUTER),
+    })
+    for chain, routers in DEX_ROUTERS_BY_CHAIN.items()
+}
+_NO_DEX_ROUTERS = MappingProxyType({})
+
+
+def get_dex_routers(chain_name: str) -> Mapping[str, str]:
     """
     Get DEX router addresses for a specific chain
     
@@ -275,18 +331,7 @@ def get_dex_routers(chain_name: str) -> dict:
         chain_name: Lowercase chain name
     
     Returns:
-        Dictionary of DEX name -> router address
+        Read-only mapping of DEX name -> router address (copy it with
+        dict() if it needs to be modified)
     """
-    chain_name = chain_name.lower()
-    if chain_name not in DEX_ROUTERS_BY_CHAIN:
-        return {}
-    
-    routers = DEX_ROUTERS_BY_CHAIN[chain_name].copy()
-    
-    # Add common DEXes that are available on most chains
-    # Uniswap V3 is usually available everywhere
-    if 'Uniswap V3 Router' not in routers:
-        routers['Uniswap V3 Router'] = "0x68b3465833fb72A70ecDF485E0e4C7bD8665Fc45"
-    
-    return routers
-
+    return _DEX_ROUTERS_FINAL.get(chain_name.lower(), _NO_DEX_ROUTERS)
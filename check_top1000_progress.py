@@ -4,7 +4,10 @@ Check progress of top1000 download
 Shows: number of coins processed, CSV files created, QuestDB stats
 """
 
+import heapq
 import os
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
 from questdb import get_questdb_connection
 
@@ -14,18 +17,27 @@ def check_progress():
     print("Top1000 Download Progress Check")
     print("="*80)
     
+    # Open the QuestDB connection in the background while the CSV files are scanned
+    executor = ThreadPoolExecutor(max_workers=1)
+    conn_future = executor.submit(get_questdb_connection)
+    executor.shutdown(wait=False)
+    
     # Check CSV files
     csv_dir = Path.home() / ".dex_trades_extractor" / ".files" / "price" / "cryptocompare"
     if csv_dir.exists():
-        csv_files = list(csv_dir.glob("*.csv"))
+        # One scandir pass; each entry is stat'ed once for mtime and size
+        csv_files = []
+        with os.scandir(csv_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.csv'):
+                    st = entry.stat()
+                    csv_files.append((st.st_mtime, entry.name, st.st_size))
         print(f"\nCSV Files Created: {len(csv_files)}")
         if csv_files:
             # Get newest files
-            csv_files.sort(key=lambda p: p.stat().st_mtime, reverse=True)
             print("\nMost recently created CSV files:")
-            for f in csv_files[:10]:
-                size = f.stat().st_size / 1024  # KB
-                print(f"  {f.name:20} : {size:>8.1f} KB")
+            for _, name, size in heapq.nlargest(10, csv_files, key=itemgetter(0)):
+                print(f"  {name:20} : {size / 1024:>8.1f} KB")
     else:
         print("\nCSV directory not found")
     
@@ -33,18 +45,15 @@ def check_progress():
     print("\n" + "="*80)
     print("QuestDB Statistics")
     print("="*80)
-    conn = get_questdb_connection()
+    coin_count = 0
+    conn = conn_future.result()
     if conn:
         try:
             with conn.cursor() as cur:
-                # Count distinct coins
-                cur.execute("SELECT COUNT(DISTINCT coin) FROM crypto_hourly")
-                coin_count = cur.fetchone()[0]
+                # Distinct coins and total rows in one scan
+                cur.execute("SELECT COUNT(DISTINCT coin), COUNT(*) FROM crypto_hourly")
+                coin_count, total_rows = cur.fetchone()
                 print(f"\nCoins with data in QuestDB: {coin_count}")
-                
-                # Total rows
-                cur.execute("SELECT COUNT(*) FROM crypto_hourly")
-                total_rows = cur.fetchone()[0]
                 print(f"Total rows in QuestDB: {total_rows:,}")
                 
                 # Rows per coin (top 20)
@@ -4,33 +4,117 @@ CoinGecko API integration
 Provides functions for fetching cryptocurrency data from CoinGecko API
 """
 
+import logging
 import requests
+import threading
 import time
-import json
 import os
-from typing import Dict, Optional
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
 
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Tracebacks of unexpected fetch errors, shown when debug logging is enabled
+logger = logging.getLogger(__name__)
 
 # Default file paths
 DEFAULT_MAPPING_FILE = 'coingecko_symbol_mapping.json'
 DEFAULT_CACHE_FILE = 'coingecko_cache.json'
 
+# A mapping file younger than this is reused instead of re-downloading /coins/list
+MAPPING_MAX_AGE = 24 * 3600
 
-def get_top_1000_by_marketcap(api_key: str = None) -> list:
+# Pooled session shared by every CoinGecko call, so connections (and their
+# TLS handshakes) are reused. Rate limits and gateway errors are retried with
+# exponential backoff, waiting as long as CoinGecko's Retry-After asks.
+# raise_on_status=False: after the last retry callers still get the response
+# and report the HTTP error themselves.
+_SESSION = requests.Session()
+_SESSION.headers.update({'User-Agent': 'ethereum_tx_tracking/1'})
+_SESSION.mount('https://', HTTPAdapter(max_retries=Retry(
+    total=5, backoff_factor=2, status_forcelist=[429, 502, 503, 504],
+    respect_retry_after_header=True, raise_on_status=False,
+)))
+
+# Local-time UTC offsets are multiples of 15 minutes, so all timestamps in a
+# 15-minute bucket share one local date (and one price cache key)
+DATE_BUCKET_SECONDS = 900
+
+# CoinGecko may not have priced a day yet for about this long, so a missing
+# price for a more recent day is not cached as final
+HISTORY_SETTLE_SECONDS = 48 * 3600
+
+# Minimum spacing between price requests (free API rate limit), shared by all threads
+MIN_REQUEST_INTERVAL = 0.5
+_rate_limit_lock = threading.Lock()
+_next_request_at = 0.0
+
+# /coins/markets pages are heavier than price lookups: concurrent pages start
+# this many seconds apart, and a page still rate limited after the session's
+# retries is re-requested MARKET_PAGE_RETRIES times in all, waiting
+# MARKET_PAGE_BACKOFF, 2x, ... seconds in between
+MARKET_PAGE_INTERVAL = 3.0
+MARKET_PAGE_RETRIES = 3
+MARKET_PAGE_BACKOFF = 10.0
+
+
+def _wait_for_rate_limit():
+    """Block until the next CoinGecko price request may be sent"""
+    global _next_request_at
+    with _rate_limit_lock:
+        now = time.monotonic()
+        wait = _next_request_at - now
+        _next_request_at = max(now, _next_request_at) + MIN_REQUEST_INTERVAL
+    if wait > 0:
+        time.sleep(wait)
+
+
+def _get_rate_limited(url: str, **kwargs):
+    """GET through the shared session once the rate limiter allows it"""
+    _wait_for_rate_limit()
+    return _SESSION.get(url, **kwargs)
+
+
+def _get_market_page(url: str, params: Dict, delay: float):
     """
-    Get top 1000 cryptocurrencies by market cap from CoinGecko API.
+    GET one /coins/markets page, retrying it after a backoff while rate limited
     
     Args:
-        api_key: Optional API key (not used for CoinGecko, kept for compatibility)
+        url: Markets endpoint URL
+        params: Query parameters for the page
+        delay: Seconds to wait first, so concurrent pages are spread out
     
     Returns:
-        List of cryptocurrency symbols ordered by market cap (highest first)
+        The last response (still a 429 if every attempt was rate limited)
+    """
+    time.sleep(delay)
+    for attempt in range(MARKET_PAGE_RETRIES):
+        response = _get_rate_limited(url, params=params, timeout=30)
+        if response.status_code != 429 or attempt == MARKET_PAGE_RETRIES - 1:
+            return response
+        wait_time = (attempt + 1) * MARKET_PAGE_BACKOFF
+        print(f"  ⚠ Page {params['page']} rate limited - retrying in {wait_time:.0f}s", flush=True)
+        time.sleep(wait_time)
+
+
+def iter_top_1000_by_marketcap(total_needed: int = 1000) -> Iterator[str]:
+    """
+    Yield the top cryptocurrencies by market cap from CoinGecko API, page by page.
+    
+    Args:
+        total_needed: Number of symbols to yield at most
+    
+    Yields:
+        Cryptocurrency symbols ordered by market cap (highest first)
     """
     base_url = 'https://api.coingecko.com/api/v3/coins/markets'
     per_page = 250  # Maximum per request (CoinGecko API limit)
-    total_needed = 1000
-    all_coins = []
+    yielded = 0
     
     print(f"\n{'='*60}", flush=True)
     print(f"Fetching top {total_needed} cryptocurrencies by market cap from CoinGecko", flush=True)
@@ -42,68 +126,80 @@ def get_top_1000_by_marketcap(api_key: str = None) -> list:
     # We need 4 requests to get 1000 coins
     num_pages = (total_needed + per_page - 1) // per_page  # Ceiling division
     
-    for page_num in range(1, num_pages + 1):
-        params = {
+    # Request the pages concurrently, started MARKET_PAGE_INTERVAL apart for the
+    # free tier, and consume them in order to keep the ranking
+    executor = ThreadPoolExecutor(max_workers=num_pages)
+    page_futures = [
+        executor.submit(_get_market_page, base_url, {
             'vs_currency': 'usd',
             'order': 'market_cap_desc',
             'per_page': per_page,
             'page': page_num
-        }
-        
-        start_idx = (page_num - 1) * per_page + 1
-        end_idx = min(page_num * per_page, total_needed)
-        
-        print(f"\n[Page {page_num}/{num_pages}] Fetching coins {start_idx} to {end_idx}...", flush=True)
-        
-        try:
-            # CoinGecko free tier rate limit: ~10-50 calls/minute
-            # Using 3 second delay to avoid rate limiting
-            if page_num > 1:
-                time.sleep(3.0)
+        }, (page_num - 1) * MARKET_PAGE_INTERVAL)
+        for page_num in range(1, num_pages + 1)
+    ]
+    
+    try:
+        for page_num, page_future in enumerate(page_futures, start=1):
+            start_idx = (page_num - 1) * per_page + 1
+            end_idx = min(page_num * per_page, total_needed)
             
-            response = requests.get(base_url, params=params, timeout=30)
-            response.raise_for_status()
-            coins = response.json()
+            print(f"\n[Page {page_num}/{num_pages}] Fetching coins {start_idx} to {end_idx}...", flush=True)
             
-            if not coins:
-                print(f"  ✓ No more coins available (got {len(all_coins)} total)", flush=True)
+            try:
+                response = page_future.result()
+                response.raise_for_status()
+                coins = orjson.loads(response.content)
+                
+                if not coins:
+                    print(f"  ✓ No more coins available (got {yielded} total)", flush=True)
+                    break
+                
+                # Extract symbols from coin data (stop at exactly total_needed)
+                page_symbols = [s.upper() for s in (c.get('symbol') for c in coins) if s]
+                page_symbols = page_symbols[:total_needed - yielded]
+                yielded += len(page_symbols)
+                print(f"  ✓ Got {len(page_symbols)} coins (total: {yielded})", flush=True)
+                
+            except requests.exceptions.HTTPError as e:
+                # Stop rather than skip: later pages would leave a gap in the ranking
+                if e.response.status_code == 429:
+                    print(f"  ✗ Still rate limited after {MARKET_PAGE_RETRIES} attempts - "
+                          f"stopping at {yielded} of {total_needed} coins", flush=True)
+                else:
+                    print(f"  ✗ HTTP error: {e.response.status_code} - {e}", flush=True)
+                break
+            except requests.exceptions.RequestException as e:
+                print(f"  ✗ Request error: {type(e).__name__}: {e}", flush=True)
+                break
+            except Exception as e:
+                print(f"  ✗ Error: {type(e).__name__}: {e}", flush=True)
+                logger.debug("CoinGecko market page fetch failed", exc_info=True)
                 break
             
-            # Extract symbols from coin data
-            page_symbols = []
-            for coin in coins:
-                symbol = coin.get('symbol', '').upper()
-                if symbol:
-                    page_symbols.append(symbol)
-            
-            all_coins.extend(page_symbols)
-            print(f"  ✓ Got {len(page_symbols)} coins (total: {len(all_coins)})", flush=True)
+            # Yield outside the try so errors in the consumer are not reported as fetch errors
+            yield from page_symbols
             
             # If we got fewer coins than requested, we've reached the end
             if len(coins) < per_page:
                 print(f"  ✓ Reached end of available coins", flush=True)
                 break
-            
-        except requests.exceptions.HTTPError as e:
-            if e.response.status_code == 429:
-                print(f"  ✗ Rate limited - waiting 5 seconds before retry...", flush=True)
-                time.sleep(5.0)
-                continue  # Retry this page
-            else:
-                print(f"  ✗ HTTP error: {e.response.status_code} - {e}", flush=True)
-                break
-        except requests.exceptions.RequestException as e:
-            print(f"  ✗ Request error: {type(e).__name__}: {e}", flush=True)
-            break
-        except Exception as e:
-            print(f"  ✗ Error: {type(e).__name__}: {e}", flush=True)
-            import traceback
-            traceback.print_exc()
-            break
-    
-    # Limit to exactly 1000 (or whatever we got if less)
-    if len(all_coins) > total_needed:
-        all_coins = all_coins[:total_needed]
+    finally:
+        # Drop pages that are no longer needed (early end, error or consumer stopped)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def get_top_1000_by_marketcap(api_key: str = None) -> list:
+    """
+    Get top 1000 cryptocurrencies by market cap from CoinGecko API.
+    
+    Args:
+        api_key: Optional API key (not used for CoinGecko, kept for compatibility)
+    
+    Returns:
+        List of cryptocurrency symbols ordered by market cap (highest first)
+    """
+    all_coins = list(iter_top_1000_by_marketcap())
     
     print(f"\n{'='*60}", flush=True)
     print(f"Successfully fetched {len(all_coins)} cryptocurrencies", flush=True)
@@ -112,6 +208,26 @@ def get_top_1000_by_marketcap(api_key: str = None) -> list:
     return all_coins
 
 
+def get_symbol_mapping(mapping_file: str = DEFAULT_MAPPING_FILE, force_refresh: bool = False) -> Dict[str, str]:
+    """
+    Get symbol → CoinGecko ID mapping, refreshing it only when needed
+    
+    Args:
+        mapping_file: Path of the mapping file
+        force_refresh: Refresh even if the mapping file is recent
+    
+    Returns:
+        {symbol: coin_id} mapping from the file if it is younger than
+        MAPPING_MAX_AGE, otherwise freshly built by refresh_symbol_mapping
+    """
+    if not force_refresh and os.path.exists(mapping_file):
+        if time.time() - os.path.getmtime(mapping_file) < MAPPING_MAX_AGE:
+            mapping = load_symbol_mapping(mapping_file)
+            if mapping:
+                return mapping
+    return refresh_symbol_mapping(mapping_file)
+
+
 def refresh_symbol_mapping(mapping_file: str = DEFAULT_MAPPING_FILE) -> Dict[str, str]:
     """
     Refresh symbol → CoinGecko ID mapping
@@ -125,16 +241,22 @@ def refresh_symbol_mapping(mapping_file: str = DEFAULT_MAPPING_FILE) -> Dict[str
     """
     print("Refreshing CoinGecko symbol mapping...")
     
+    # Start the large /coins/list download (step 2) while step 1 runs
+    executor = ThreadPoolExecutor(max_workers=1)
+    coins_list_future = executor.submit(
+        _get_rate_limited, "https://api.coingecko.com/api/v3/coins/list", timeout=60
+    )
+    executor.shutdown(wait=False)
+    
     # Step 1: Get canonical IDs from top 200 (for conflict resolution)
     canonical_ids = {}
     try:
         url = "https://api.coingecko.com/api/v3/coins/markets"
         params = {'vs_currency': 'usd', 'per_page': 200, 'order': 'market_cap_desc', 'page': 1}
-        time.sleep(0.5)
-        response = requests.get(url, params=params, timeout=30)
+        response = _get_rate_limited(url, params=params, timeout=30)
         
         if response.status_code == 200:
-            top200 = response.json()
+            top200 = orjson.loads(response.content)
             for coin in top200:
                 symbol = coin.get('symbol', '').upper()
                 coin_id = coin.get('id', '')
@@ -148,12 +270,10 @@ def refresh_symbol_mapping(mapping_file: str = DEFAULT_MAPPING_FILE) -> Dict[str
     # Step 2: Get all coins from /coins/list
     symbol_mapping = {}
     try:
-        url = "https://api.coingecko.com/api/v3/coins/list"
-        time.sleep(0.5)
-        response = requests.get(url, timeout=60)
+        response = coins_list_future.result()
         
         if response.status_code == 200:
-            all_coins = response.json()
+            all_coins = orjson.loads(response.content)
             print(f"  ✓ Got {len(all_coins)} coins from /coins/list")
             
             # Step 3: Build mapping (use canonical when available, otherwise first or heuristic)
@@ -162,25 +282,23 @@ def refresh_symbol_mapping(mapping_file: str = DEFAULT_MAPPING_FILE) -> Dict[str
                 coin_id = coin.get('id', '')
                 
                 if symbol and coin_id:
-                    if symbol in canonical_ids:
-                        # Use canonical ID (from top 200, highest market cap)
-                        symbol_mapping[symbol] = canonical_ids[symbol]
-                    elif symbol not in symbol_mapping:
-                        # First time seeing this symbol
-                        symbol_mapping[symbol] = coin_id
-                    else:
+                    current_id = symbol_mapping.get(symbol)
+                    if current_id is None:
+                        # Canonical ID (from top 200, highest market cap) or first seen
+                        symbol_mapping[symbol] = canonical_ids.get(symbol, coin_id)
+                    elif symbol not in canonical_ids and len(coin_id) < len(current_id):
                         # Conflict - use heuristic: prefer non-bridged, shorter ID
-                        current_id = symbol_mapping[symbol]
-                        if ('bridged' not in coin_id.lower() and 'peg' not in coin_id.lower() and 
-                            len(coin_id) < len(current_id)):
+                        # (cheap length test first, lowercase only the shorter candidates)
+                        coin_id_lc = coin_id.lower()
+                        if 'bridged' not in coin_id_lc and 'peg' not in coin_id_lc:
                             symbol_mapping[symbol] = coin_id
             
             print(f"  ✓ Built mapping with {len(symbol_mapping)} unique symbols")
             
             # Save to file
             try:
-                with open(mapping_file, 'w') as f:
-                    json.dump(symbol_mapping, f, indent=2)
+                with open(mapping_file, 'wb') as f:
+                    f.write(orjson.dumps(symbol_mapping, option=orjson.OPT_INDENT_2))
                 print(f"  ✓ Saved to {mapping_file}")
             except Exception as e:
                 print(f"  ⚠ Could not save mapping file: {e}")
@@ -209,8 +327,8 @@ def load_symbol_mapping(mapping_file: str = DEFAULT_MAPPING_FILE) -> Dict[str, s
     """
     if os.path.exists(mapping_file):
         try:
-            with open(mapping_file, 'r') as f:
-                mapping = json.load(f)
+            with open(mapping_file, 'rb') as f:
+                mapping = orjson.loads(f.read())
                 print(f"  ✓ Loaded {len(mapping)} mappings from file")
                 return mapping
         except Exception:
@@ -249,20 +367,44 @@ def query_coingecko_price(coingecko_id: str, timestamp: int) -> Optional[float]:
     Returns:
         Price in USD or None if not found
     """
+    return query_coingecko_history(coingecko_id, timestamp)[0]
+
+
+def query_coingecko_history(coingecko_id: str, timestamp: int) -> Tuple[Optional[float], bool]:
+    """
+    Query CoinGecko /history for a day and report whether the answer is final
+    
+    Args:
+        coingecko_id: CoinGecko coin ID (e.g., 'bitcoin', 'ethereum')
+        timestamp: Unix timestamp
+    
+    Returns:
+        (price, definitive): price in USD or None; definitive is True when
+        CoinGecko answered (200/404), so a None price is safe to cache.
+        A 200 without data for the last HISTORY_SETTLE_SECONDS, rate limits,
+        server errors and exceptions are not definitive.
+    """
     try:
-        date_str = datetime.fromtimestamp(timestamp).strftime('%d-%m-%Y')
+        # Same local day as the cache key; reuses the memoized date formatting
+        year, month, day = get_cache_date(timestamp).split('-')
+        date_str = f"{day}-{month}-{year}"
         url = f"https://api.coingecko.com/api/v3/coins/{coingecko_id}/history"
         params = {'date': date_str}
         
-        time.sleep(0.5)  # Rate limit for free API
-        response = requests.get(url, params=params, timeout=10)
+        _wait_for_rate_limit()  # Rate limit for free API
+        response = _SESSION.get(url, params=params, timeout=10)
         
         if response.status_code == 200:
-            data = response.json()
+            data = orjson.loads(response.content)
             if 'market_data' in data and 'current_price' in data['market_data']:
-                return float(data['market_data']['current_price']['usd'])
+                return float(data['market_data']['current_price']['usd']), True
+            # No market data for that day; only final once the day has settled
+            return None, time.time() - timestamp > HISTORY_SETTLE_SECONDS
+        elif response.status_code == 404:
+            print(f"  ⚠ CoinGecko has no coin {coingecko_id}")
+            return None, True
         elif response.status_code == 429:
-            # Rate limited - can't use cache from different date (would be wrong price)
+            # Still rate limited after retries - can't use cache from different date (would be wrong price)
             print(f"  ⚠ Rate limited for {coingecko_id} on {date_str} - will retry or mark unavailable")
             # Don't use cached price from different date - better to mark as unavailable
             # than use wrong price
@@ -271,6 +413,66 @@ def query_coingecko_price(coingecko_id: str, timestamp: int) -> Optional[float]:
     except Exception as e:
         print(f"  ⚠ Exception querying CoinGecko for {coingecko_id}: {e}")
     
+    return None, False
+
+
+def query_coingecko_range(coingecko_id: str, from_ts: int, to_ts: int) -> Optional[List[Tuple[int, float]]]:
+    """
+    Query CoinGecko /market_chart/range for all USD prices in a time span
+    
+    Granularity is chosen by CoinGecko from the span: 5-minutely up to a day,
+    hourly up to 90 days, daily (at 00:00 UTC) beyond that.
+    
+    Args:
+        coingecko_id: CoinGecko coin ID (e.g., 'bitcoin', 'ethereum')
+        from_ts: Unix timestamp, start of the span
+        to_ts: Unix timestamp, end of the span
+    
+    Returns:
+        [(timestamp_seconds, price_usd), ...] in time order, or None on failure
+    """
+    try:
+        url = f"https://api.coingecko.com/api/v3/coins/{coingecko_id}/market_chart/range"
+        params = {'vs_currency': 'usd', 'from': int(from_ts), 'to': int(to_ts)}
+        
+        _wait_for_rate_limit()  # Rate limit for free API
+        response = _SESSION.get(url, params=params, timeout=30)
+        
+        if response.status_code == 200:
+            return [(int(point[0]) // 1000, float(point[1]))
+                    for point in orjson.loads(response.content).get('prices', [])
+                    if point[1] is not None]
+        print(f"  ⚠ CoinGecko range error for {coingecko_id}: {response.status_code}")
+    except Exception as e:
+        print(f"  ⚠ Exception querying CoinGecko range for {coingecko_id}: {e}")
+    
+    return None
+
+
+def query_coingecko_market_chart(coingecko_id: str, days: str = 'max') -> Optional[Dict[str, list]]:
+    """
+    Query CoinGecko /market_chart for a coin's USD price history
+    
+    Args:
+        coingecko_id: CoinGecko coin ID (e.g., 'bitcoin', 'ethereum')
+        days: Number of days back, or 'max' for the full history
+    
+    Returns:
+        {'prices': [[ms, value], ...], 'market_caps': [...], 'total_volumes': [...]},
+        or None on failure (including rate limits after retries)
+    """
+    try:
+        url = f"https://api.coingecko.com/api/v3/coins/{coingecko_id}/market_chart"
+        params = {'vs_currency': 'usd', 'days': days}
+        
+        response = _get_rate_limited(url, params=params, timeout=30)
+        
+        if response.status_code == 200:
+            return orjson.loads(response.content)
+        print(f"  ⚠ CoinGecko market chart error for {coingecko_id}: {response.status_code}")
+    except Exception as e:
+        print(f"  ⚠ Exception querying CoinGecko market chart for {coingecko_id}: {e}")
+    
     return None
 
 
@@ -285,6 +487,24 @@ def get_cache_key(symbol: str, timestamp: int) -> str:
     Returns:
         Cache key string
     """
-    date_str = datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d')
-    return f"{symbol.upper()}_{date_str}"
+    return f"{symbol.upper()}_{get_cache_date(timestamp)}"
+
+
+def get_cache_date(timestamp: int) -> str:
+    """
+    Date part (YYYY-MM-DD, local time) of the cache key for a timestamp
+    
+    Args:
+        timestamp: Unix timestamp
+    
+    Returns:
+        Date string
+    """
+    return _bucket_date(timestamp - timestamp % DATE_BUCKET_SECONDS)
+
+
+@lru_cache(maxsize=None)
+def _bucket_date(bucket_start: int) -> str:
+    """Local date (YYYY-MM-DD) of a DATE_BUCKET_SECONDS-aligned timestamp"""
+    return datetime.fromtimestamp(bucket_start).strftime('%Y-%m-%d')
 
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
 Download historical price data from CoinGecko as CSV.
-Uses undetected-chromedriver to avoid Cloudflare detection.
+Tries the CoinGecko API first; falls back to the website export, using
+undetected-chromedriver to avoid Cloudflare detection.
 """
 
 import undetected_chromedriver as uc
@@ -9,23 +10,205 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import (
+    StaleElementReferenceException, TimeoutException, WebDriverException,
+)
+import csv
+import requests
 import time
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: no profile lock, Chrome's own profile lock applies
 
-def wait_for_page_load(driver):
+from coingecko import query_coingecko_market_chart
+
+# Persistent Chrome profile, so the Cloudflare clearance cookie survives between runs
+PROFILE_DIR = os.path.expanduser("~/.cache/coingecko-uc-profile")
+
+# Lock on PROFILE_DIR held by this process (one Chrome per profile at a time)
+_profile_lock = None
+
+# Seconds before driver.get() gives up on a page
+PAGE_LOAD_TIMEOUT = 60
+
+# Seconds to wait for a Cloudflare captcha to be solved manually
+CAPTCHA_TIMEOUT = 300
+
+# How often element waits re-check the page (seconds)
+POLL_INTERVAL = 0.15
+
+# Menu that opens under the export button
+DROPDOWN_MENU_XPATH = "//*[contains(@class, 'dropdown-menu') or @role='menu']"
+
+# Export dropdown entry for the CSV download
+CSV_OPTION_XPATH = (
+    "//*[self::a or self::button]"
+    "[contains(translate(normalize-space(.), 'CSV', 'csv'), 'csv')]"
+)
+
+# Parallel browsers in download_batch (more risks Cloudflare IP bans)
+MAX_BATCH_WORKERS = 4
+
+# Seconds to wait for a clicked CSV export to finish downloading
+DOWNLOAD_TIMEOUT = 120
+
+# A coin's CSV younger than this is reused instead of downloaded again
+CSV_MAX_AGE = 24 * 3600
+
+
+class CloudflareChallenge(Exception):
+    """A Cloudflare captcha needs to be solved in a visible browser window"""
+
+
+def _acquire_profile():
     """
-    Wait for page to load and check for Cloudflare challenge.
-    Waits indefinitely until the page loads (allows manual captcha solving).
-    Returns True when page loaded successfully.
+    Claim the persistent Chrome profile for this process.
+    
+    Returns:
+        PROFILE_DIR, or None if another process (e.g. a download_batch
+        worker) is using it - that browser then gets a fresh profile
     """
-    print("Waiting for page to load...")
+    global _profile_lock
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if fcntl is None or _profile_lock is not None:
+        return PROFILE_DIR
+    
+    lock_file = open(PROFILE_DIR + '.lock', 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    # Held until the process exits; drivers of this process reuse the profile one after another
+    _profile_lock = lock_file
+    return PROFILE_DIR
+
+
+def cached_csv_path(coin_id, download_dir):
+    """Stable path of the downloaded CSV for a coin"""
+    return os.path.join(download_dir, f"{coin_id}-usd-max.csv")
+
+
+def _list_csv_files(download_dir):
+    """Names of the CSV files in a directory"""
+    return [name for name in os.listdir(download_dir) if name.endswith('.csv')]
+
+
+def download_historical_data_api(coin_id, download_dir):
+    """
+    Download a coin's price history through the CoinGecko API (no browser).
+    Writes the same columns as the website CSV export.
+    
+    Args:
+        coin_id: CoinGecko coin ID (e.g., "bitcoin", "zcash", "ethereum")
+        download_dir: Directory to save the CSV file
+    
+    Returns:
+        Path of the CSV file, or None if the API did not return the data
+    """
+    data = query_coingecko_market_chart(coin_id)
+    if not data or not data.get('prices'):
+        return None
+    
+    market_caps = {point[0]: point[1] for point in data.get('market_caps', [])}
+    total_volumes = {point[0]: point[1] for point in data.get('total_volumes', [])}
+    
+    csv_path = cached_csv_path(coin_id, download_dir)
+    tmp_path = csv_path + '.part'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['snapped_at', 'price', 'market_cap', 'total_volume'])
+        for timestamp_ms, price in data['prices']:
+            snapped_at = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+            writer.writerow([
+                snapped_at.strftime('%Y-%m-%d %H:%M:%S UTC'), price,
+                market_caps.get(timestamp_ms), total_volumes.get(timestamp_ms),
+            ])
+    os.replace(tmp_path, csv_path)
+    print(f"  ✓ Saved {csv_path} ({len(data['prices'])} rows from the API)")
+    return csv_path
+
+
+def wait_for_download(download_dir, csv_files_before, timeout=DOWNLOAD_TIMEOUT):
+    """
+    Wait until Chrome has finished downloading a new CSV file.
+    Chrome writes to <name>.crdownload and renames it when complete.
+    
+    Args:
+        download_dir: Directory the browser downloads to
+        csv_files_before: Names of the CSV files present before the download started
+        timeout: Seconds to wait at most
+    
+    Returns:
+        Path of the new CSV file
+    
+    Raises:
+        TimeoutError: If no completed CSV file appears in time
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        names = os.listdir(download_dir)
+        in_progress = {name for name in names if name.endswith('.crdownload')}
+        new_csv_files = [name for name in names
+                         if name.endswith('.csv') and name not in csv_files_before
+                         and name + '.crdownload' not in in_progress]
+        if new_csv_files:
+            newest_csv = max(new_csv_files,
+                             key=lambda name: os.path.getmtime(os.path.join(download_dir, name)))
+            return os.path.join(download_dir, newest_csv)
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f"No completed CSV download in {download_dir} after {timeout}s")
+        time.sleep(0.25)
+
+
+def _fetch_csv_link(driver, csv_option, csv_path):
+    """
+    Download the CSV behind the export link directly with the browser's session.
     
-    # Wait a moment for page to start loading
-    time.sleep(2)
+    Args:
+        driver: Chrome driver on the historical data page
+        csv_option: The CSV entry of the export dropdown
+        csv_path: Where to save the CSV file
+    
+    Returns:
+        csv_path if the file was saved, None if the link can't be fetched
+        this way (the caller falls back to clicking)
+    """
+    href = csv_option.get_attribute("href")
+    if not href:
+        return None
     
-    # Check for Cloudflare challenge indicators
+    print(f"Fetching CSV directly: {href}")
+    try:
+        # Cloudflare clearance is bound to the cookies and the browser's User-Agent
+        cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
+        user_agent = driver.execute_script("return navigator.userAgent")
+        response = requests.get(href, cookies=cookies, headers={'User-Agent': user_agent}, timeout=60)
+    except requests.exceptions.RequestException as e:
+        print(f"  ⚠ Direct CSV fetch failed: {e}")
+        return None
+    
+    # A challenge or error page comes back as HTML
+    if response.status_code != 200 or response.content.lstrip().startswith(b'<'):
+        print(f"  ⚠ Direct CSV fetch returned {response.status_code} - clicking instead")
+        return None
+    
+    tmp_path = csv_path + '.part'
+    with open(tmp_path, 'wb') as f:
+        f.write(response.content)
+    os.replace(tmp_path, csv_path)
+    print(f"  ✓ Saved {csv_path}")
+    return csv_path
+
+
+def _detect_cloudflare_challenge(driver):
+    """Return True if the current page is a Cloudflare challenge"""
     challenge_detected = False
     
     try:
@@ -46,214 +229,376 @@ def wait_for_page_load(driver):
                 challenge_detected = True
                 print(f"  ⚠ Cloudflare Turnstile iframe detected: id='{iframe_id}'")
                 break
-    except:
+    except WebDriverException:
+        # Page changed while it was inspected (e.g. stale iframe)
         pass
     
-    # If challenge detected, wait indefinitely for it to be solved
-    if challenge_detected:
+    return challenge_detected
+
+
+def wait_for_page_load(driver, wait, headless=False):
+    """
+    Wait for page to load and check for Cloudflare challenge.
+    Waits up to CAPTCHA_TIMEOUT for a captcha to be solved manually.
+    Returns True when page loaded successfully, False when a challenge
+    shows up in a headless browser (it can't be solved there).
+    Raises TimeoutError if the captcha is not solved in time.
+    
+    Args:
+        driver: Chrome driver that is navigating to the page
+        wait: WebDriverWait used for the export button once no challenge is seen
+        headless: Whether the browser window is invisible
+    """
+    print("Waiting for page to load...")
+    export_button_present = EC.presence_of_element_located((By.ID, "export"))
+    
+    # Return as soon as the export button appears (the usual case)
+    try:
+        WebDriverWait(driver, 2, poll_frequency=POLL_INTERVAL).until(export_button_present)
+        print("  ✓ Page loaded successfully (no challenge detected)")
+        return True
+    except TimeoutException:
+        pass
+    
+    # If challenge detected, wait (bounded) for it to be solved
+    if _detect_cloudflare_challenge(driver):
+        if headless:
+            print("  ⚠ The captcha can't be solved in a headless browser")
+            return False
+        
         print("  Please solve the captcha manually in the browser window.")
         print("  The script will wait until the page loads...")
         
-        while True:
-            # Check if export button is present (means page loaded successfully)
-            try:
-                export_button = driver.find_element(By.ID, "export")
-                if export_button:
-                    print("  ✓ Page loaded successfully!")
-                    return True
-            except:
-                pass
-            
-            # Check if we're on CoinGecko page (not challenge page)
-            try:
-                current_url = driver.current_url
-                if "coingecko.com" in current_url and "challenge" not in current_url.lower():
-                    # Give it a moment and check for export button
-                    time.sleep(1)
-                    try:
-                        export_button = driver.find_element(By.ID, "export")
-                        if export_button:
-                            print("  ✓ Challenge solved, page loaded!")
-                            return True
-                    except:
-                        pass
-            except:
-                pass
-            
-            time.sleep(2)  # Check every 2 seconds
-    
-    # No challenge detected, check if page loaded
-    try:
-        export_button = driver.find_element(By.ID, "export")
-        if export_button:
-            print("  ✓ Page loaded successfully (no challenge detected)")
-            return True
-    except:
-        pass
+        # The page reloads while the challenge is solved, so ignore transient driver errors
+        try:
+            WebDriverWait(driver, CAPTCHA_TIMEOUT, poll_frequency=POLL_INTERVAL,
+                          ignored_exceptions=(WebDriverException,)).until(export_button_present)
+        except TimeoutException:
+            raise TimeoutError(f"Cloudflare challenge not solved within {CAPTCHA_TIMEOUT}s")
+        print("  ✓ Challenge solved, page loaded!")
+        return True
     
-    # Wait a bit more and check again
-    time.sleep(2)
+    # No challenge detected, give the page more time
     try:
-        export_button = driver.find_element(By.ID, "export")
-        if export_button:
-            print("  ✓ Page loaded successfully")
-            return True
-    except:
+        wait.until(export_button_present)
+        print("  ✓ Page loaded successfully")
+        return True
+    except TimeoutException:
         pass
     
     print("  ⚠ Could not find export button - page may not have loaded")
     return True  # Continue anyway, let it fail later if needed
 
 
-def download_historical_data(coin_id="bitcoin", download_dir=None):
+def start_driver(download_dir, headless=True, fresh_profile=False):
     """
-    Download historical data CSV from CoinGecko for a given coin.
+    Start a Chrome session that saves downloads to download_dir.
     
     Args:
-        coin_id: CoinGecko coin ID (e.g., "bitcoin", "zcash", "ethereum")
-        download_dir: Directory to save the CSV file (defaults to current directory)
-    """
-    if download_dir is None:
-        download_dir = os.getcwd()
-    
-    # Ensure download directory exists
-    os.makedirs(download_dir, exist_ok=True)
+        download_dir: Directory to save the CSV files
+        headless: Run without a window (no captcha can be solved then)
+        fresh_profile: Use a temporary profile instead of PROFILE_DIR
     
+    Returns:
+        undetected-chromedriver Chrome driver
+    """
     # Set up undetected Chrome options
     options = uc.ChromeOptions()
     options.add_experimental_option("prefs", {
         "download.default_directory": download_dir,
         "download.prompt_for_download": False,
         "download.directory_upgrade": True,
-        "safebrowsing.enabled": True
+        "safebrowsing.enabled": True,
+        # Logos, charts and ad creatives are never used - don't fetch or decode them
+        "profile.managed_default_content_settings.images": 2
     })
+    options.add_argument("--blink-settings=imagesEnabled=false")
+    options.add_argument("--disable-gpu")
+    # Return from driver.get() at DOMContentLoaded instead of waiting for every
+    # image and third-party script (the challenge page is still fully detectable)
+    options.page_load_strategy = "eager"
+    if headless:
+        # No window, compositor or extensions: nothing on the page needs them
+        for argument in ("--headless=new", "--no-sandbox", "--disable-dev-shm-usage",
+                         "--disable-extensions", "--disable-infobars", "--disable-popup-blocking"):
+            options.add_argument(argument)
+    
+    profile_dir = None if fresh_profile else _acquire_profile()
+    if profile_dir:
+        options.add_argument(f"--user-data-dir={profile_dir}")
     
     print(f"Starting browser with undetected-chromedriver...")
     print(f"  This should avoid Cloudflare detection compared to regular Selenium.")
     print(f"  Download directory: {download_dir}")
+    print(f"  Profile: {profile_dir or 'temporary'}")
     
     # Use undetected-chromedriver (specify Chrome version 142)
     # This ensures ChromeDriver matches the installed Chrome version
     driver = uc.Chrome(options=options, version_main=142)
     
+    # Element lookups fail immediately; all waiting is done by explicit WebDriverWaits
+    driver.implicitly_wait(0)
+    # A page that never loads raises TimeoutException instead of hanging
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+    
+    # Set window size
+    driver.set_window_size(1920, 1080)
+    return driver
+
+
+def fetch_one(driver, coin_id, download_dir, headless=False):
+    """
+    Download the historical data CSV for one coin with an open browser.
+    
+    Args:
+        driver: Chrome driver from start_driver
+        coin_id: CoinGecko coin ID (e.g., "bitcoin", "zcash", "ethereum")
+        download_dir: Directory the driver saves downloads to
+        headless: Whether the driver was started headless
+    
+    Returns:
+        Path of the downloaded CSV file
+    
+    Raises:
+        CloudflareChallenge: If a captcha shows up in a headless browser
+        TimeoutError: If the download does not finish in time
+    """
+    url = f"https://www.coingecko.com/en/coins/{coin_id}/historical_data"
+    print(f"Navigating to: {url}")
+    driver.get(url)
+    
+    # Wait for page to load (with Cloudflare check)
+    # Waits up to CAPTCHA_TIMEOUT for a manual captcha solve
+    wait = WebDriverWait(driver, 30, poll_frequency=POLL_INTERVAL)
+    if not wait_for_page_load(driver, wait, headless):
+        raise CloudflareChallenge(f"Cloudflare challenge for {coin_id} needs a visible browser")
+    
+    # Wait for export button to be clickable
+    print("Looking for export button...")
+    
+    # Find export button
+    export_button = None
     try:
-        # Set window size
-        driver.set_window_size(1920, 1080)
-        
-        url = f"https://www.coingecko.com/en/coins/{coin_id}/historical_data"
-        print(f"Navigating to: {url}")
-        driver.get(url)
-        
-        # Wait for page to load (with Cloudflare check)
-        # Will wait indefinitely until page loads (allows manual captcha solving)
-        wait_for_page_load(driver)
-        
-        time.sleep(2)  # Additional wait for page to fully load
-        
-        # Wait for export button to be clickable
-        print("Looking for export button...")
-        wait = WebDriverWait(driver, 30)
-        
-        # Find export button
-        export_button = None
+        export_button = wait.until(
+            EC.presence_of_element_located((By.ID, "export"))
+        )
+        print("Found export button by ID")
+    except TimeoutException:
         try:
             export_button = wait.until(
-                EC.presence_of_element_located((By.ID, "export"))
+                EC.presence_of_element_located((By.CSS_SELECTOR, "[data-coin-historical-data-target='exportButton']"))
             )
-            print("Found export button by ID")
-        except:
-            try:
-                export_button = wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "[data-coin-historical-data-target='exportButton']"))
-                )
-                print("Found export button by data attribute")
-            except:
-                export_button = wait.until(
-                    EC.presence_of_element_located((By.XPATH, "//button[@id='export' or contains(@data-coin-historical-data-target, 'exportButton')]"))
-                )
-                print("Found export button by XPath")
-        
-        # Scroll to button
-        driver.execute_script("arguments[0].scrollIntoView(true);", export_button)
-        time.sleep(1)
-        
-        # Make sure it's clickable
-        export_button = wait.until(EC.element_to_be_clickable(export_button))
-        
-        print("Clicking export button...")
-        export_button.click()
-        
-        # Wait for dropdown to appear
-        print("Waiting for dropdown menu to appear...")
-        time.sleep(3)
-        
-        # Find and click the CSV option in the dropdown
-        print("Looking for CSV option in dropdown...")
-        
-        # Try multiple possible selectors for the CSV link
-        csv_selectors = [
-            (By.XPATH, "//a[contains(text(), '.csv')]"),
-            (By.XPATH, "//button[contains(text(), '.csv')]"),
-            (By.XPATH, "//*[contains(text(), '.csv')]"),
-            (By.XPATH, "//a[contains(text(), 'CSV')]"),
-            (By.XPATH, "//button[contains(text(), 'CSV')]"),
-            (By.XPATH, "//*[contains(text(), 'CSV')]"),
-        ]
-        
-        csv_option = None
-        for by, selector in csv_selectors:
+            print("Found export button by data attribute")
+        except TimeoutException:
+            export_button = wait.until(
+                EC.presence_of_element_located((By.XPATH, "//button[@id='export' or contains(@data-coin-historical-data-target, 'exportButton')]"))
+            )
+            print("Found export button by XPath")
+    
+    # Page is usable: stop loading the remaining ads/trackers
+    driver.execute_script("window.stop();")
+    
+    # Scroll to button
+    driver.execute_script("arguments[0].scrollIntoView(true);", export_button)
+    time.sleep(1)
+    
+    # Make sure it's clickable
+    export_button = wait.until(EC.element_to_be_clickable(export_button))
+    
+    print("Clicking export button...")
+    export_button.click()
+    
+    # Wait for dropdown to appear (the CSV option lookup below waits as well,
+    # so an unrecognised menu only costs this timeout)
+    print("Waiting for dropdown menu to appear...")
+    try:
+        WebDriverWait(driver, 10, poll_frequency=0.1).until(
+            EC.visibility_of_element_located((By.XPATH, DROPDOWN_MENU_XPATH))
+        )
+    except TimeoutException:
+        print("  ⚠ Dropdown menu not recognised - looking for the CSV option anyway")
+    
+    # Find and click the CSV option in the dropdown
+    print("Looking for CSV option in dropdown...")
+    
+    # One query for every link/button whose text mentions CSV (any case, incl. '.csv')
+    try:
+        csv_option = WebDriverWait(driver, 10, poll_frequency=POLL_INTERVAL,
+                                   ignored_exceptions=(StaleElementReferenceException,)).until(
+            lambda d: next((element for element in d.find_elements(By.XPATH, CSV_OPTION_XPATH)
+                            if element.is_displayed()), False)
+        )
+        print(f"Found CSV option: {csv_option.text}")
+    except TimeoutException:
+        print("Could not find CSV option. Taking screenshot for debugging...")
+        driver.save_screenshot("debug_dropdown.png")
+        print("Screenshot saved as debug_dropdown.png")
+        raise Exception("Could not find CSV option in dropdown.")
+    
+    # The CSV option is normally a plain link: fetch it with the browser's
+    # Cloudflare cookies instead of clicking and watching the download folder
+    csv_path = _fetch_csv_link(driver, csv_option, cached_csv_path(coin_id, download_dir))
+    if csv_path:
+        return csv_path
+    
+    print("Clicking CSV option...")
+    csv_files_before = set(_list_csv_files(download_dir))
+    csv_option.click()
+    
+    # Wait for download to complete
+    print("Waiting for download to complete (this may take a while for large datasets)...")
+    downloaded_csv = wait_for_download(download_dir, csv_files_before)
+    
+    # Store under a stable per-coin name so the next run can reuse it
+    csv_path = cached_csv_path(coin_id, download_dir)
+    os.replace(downloaded_csv, csv_path)
+    print(f"  ✓ Saved {csv_path}")
+    return csv_path
+
+
+def download_many(coin_ids, download_dir=None, headless=True, per_coin_dirs=False):
+    """
+    Download historical data CSVs for several coins in one browser session.
+    The Cloudflare clearance from the first page is reused for the others.
+    
+    Args:
+        coin_ids: CoinGecko coin IDs (e.g., ["bitcoin", "ethereum"])
+        download_dir: Directory to save the CSV files (defaults to current directory)
+        headless: Start the browser headless; it is restarted with a window
+            as soon as a captcha has to be solved
+        per_coin_dirs: Save each coin into its own directory download_dir/<coin_id>
+    
+    Returns:
+        {coin_id: csv_path} for every coin with a CSV file
+    """
+    if download_dir is None:
+        download_dir = os.getcwd()
+    
+    coin_dirs = {
+        coin_id: os.path.join(download_dir, coin_id) if per_coin_dirs else download_dir
+        for coin_id in coin_ids
+    }
+    
+    # Ensure download directories exist
+    os.makedirs(download_dir, exist_ok=True)
+    for coin_dir in coin_dirs.values():
+        os.makedirs(coin_dir, exist_ok=True)
+    
+    # Coins downloaded less than CSV_MAX_AGE ago need no browser at all
+    csv_paths = {}
+    for coin_id in coin_ids:
+        csv_path = cached_csv_path(coin_id, coin_dirs[coin_id])
+        if os.path.exists(csv_path) and time.time() - os.path.getmtime(csv_path) < CSV_MAX_AGE:
+            print(f"✓ Using recent download for {coin_id}: {csv_path}")
+            csv_paths[coin_id] = csv_path
+    coin_ids = [coin_id for coin_id in coin_ids if coin_id not in csv_paths]
+    
+    # The API needs no browser or captcha; the page export is the fallback
+    # (e.g. when the API is rate limited or limits the history range)
+    for coin_id in coin_ids:
+        print(f"Downloading {coin_id} through the CoinGecko API...")
+        csv_path = download_historical_data_api(coin_id, coin_dirs[coin_id])
+        if csv_path:
+            csv_paths[coin_id] = csv_path
+    coin_ids = [coin_id for coin_id in coin_ids if coin_id not in csv_paths]
+    if not coin_ids:
+        return csv_paths
+    
+    driver = start_driver(download_dir, headless)
+    try:
+        for coin_id in coin_ids:
+            coin_dir = coin_dirs[coin_id]
             try:
-                csv_option = driver.find_element(by, selector)
-                if csv_option.is_displayed():
-                    print(f"Found CSV option with selector: {selector}")
+                retried_timeout = False
+                while True:
+                    try:
+                        if coin_dir != download_dir:
+                            # Point this browser's downloads at the coin's own directory
+                            driver.execute_cdp_cmd('Page.setDownloadBehavior',
+                                                   {'behavior': 'allow', 'downloadPath': coin_dir})
+                        csv_path = fetch_one(driver, coin_id, coin_dir, headless)
+                    except CloudflareChallenge:
+                        # Solve the captcha in a visible window and keep it for the remaining coins
+                        print("Restarting browser with a visible window...")
+                        driver.quit()
+                        headless = False
+                        driver = start_driver(download_dir, headless, fresh_profile=retried_timeout)
+                        continue
+                    except (TimeoutError, TimeoutException) as e:
+                        # Stuck page, download or captcha: one retry in a fresh browser and profile
+                        if retried_timeout:
+                            raise
+                        retried_timeout = True
+                        print(f"Timed out ({e}) - retrying {coin_id} with a fresh browser profile...")
+                        driver.quit()
+                        driver = start_driver(download_dir, headless, fresh_profile=True)
+                        continue
                     break
-            except:
-                continue
-        
-        if csv_option is None:
-            # Try alternative approach
-            print("Trying alternative approach to find CSV option...")
-            all_links = driver.find_elements(By.TAG_NAME, "a")
-            all_buttons = driver.find_elements(By.TAG_NAME, "button")
-            
-            for element in all_links + all_buttons:
-                try:
-                    text = element.text.lower()
-                    if ('.csv' in text or 'csv' in text) and element.is_displayed():
-                        csv_option = element
-                        print(f"Found CSV option by text: {element.text}")
-                        break
-                except:
-                    continue
-        
-        if csv_option is None:
-            print("Could not find CSV option. Taking screenshot for debugging...")
-            driver.save_screenshot("debug_dropdown.png")
-            print("Screenshot saved as debug_dropdown.png")
-            raise Exception("Could not find CSV option in dropdown.")
-        
-        print("Clicking CSV option...")
-        csv_option.click()
-        
-        # Wait for download to complete
-        print("Waiting for download to complete (this may take a while for large datasets)...")
-        time.sleep(10)
-        
-        print(f"Download should be complete. Check {download_dir} for the CSV file.")
-        
-    except Exception as e:
-        print(f"Error: {e}")
-        import traceback
-        traceback.print_exc()
+                if csv_path:
+                    csv_paths[coin_id] = csv_path
+            except Exception as e:
+                print(f"Error downloading {coin_id}: {e}")
+                import traceback
+                traceback.print_exc()
     finally:
         print("Closing browser...")
         driver.quit()
+    
+    return csv_paths
+
+
+def download_historical_data(coin_id="bitcoin", download_dir=None, headless=True):
+    """
+    Download historical data CSV from CoinGecko for a given coin.
+    
+    Args:
+        coin_id: CoinGecko coin ID (e.g., "bitcoin", "zcash", "ethereum")
+        download_dir: Directory to save the CSV file (defaults to current directory)
+        headless: Start the browser headless (falls back to a window for captchas)
+    
+    Returns:
+        Path of the CSV file, or None if the download failed
+    """
+    return download_many([coin_id], download_dir, headless).get(coin_id)
+
+
+def download_batch(coin_ids, parent_dir, workers=MAX_BATCH_WORKERS):
+    """
+    Download historical data CSVs for many coins with parallel browsers.
+    The coins are split into one chunk per worker process (undetected-chromedriver
+    is not thread-safe); each process downloads its chunk with download_many in
+    one browser session, saving every coin into its own directory parent_dir/<coin_id>.
+    
+    Args:
+        coin_ids: CoinGecko coin IDs (e.g., ["bitcoin", "ethereum"])
+        parent_dir: Directory that receives one sub-directory per coin
+        workers: Parallel browsers (capped at MAX_BATCH_WORKERS)
+    
+    Returns:
+        {coin_id: csv_path} for every coin with a CSV file
+    """
+    workers = max(1, min(workers, MAX_BATCH_WORKERS, len(coin_ids)))
+    # Round-robin so every browser gets a similar share of the coins
+    chunks = [coin_ids[i::workers] for i in range(workers)]
+    csv_paths = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(download_many, chunk, parent_dir, True, True): chunk
+            for chunk in chunks
+        }
+        for future in as_completed(futures):
+            try:
+                csv_paths.update(future.result())
+            except Exception as e:
+                print(f"Error downloading {', '.join(futures[future])}: {e}")
+    return csv_paths
 
 
 if __name__ == "__main__":
-    coin_id = sys.argv[1] if len(sys.argv) > 1 else "bitcoin"
+    # One coin ID or a comma-separated list (downloaded in one browser session)
+    coin_ids = (sys.argv[1] if len(sys.argv) > 1 else "bitcoin").split(",")
     download_dir = sys.argv[2] if len(sys.argv) > 2 else os.getcwd()
     
-    print(f"Downloading historical data for {coin_id}...")
+    print(f"Downloading historical data for {', '.join(coin_ids)}...")
     print(f"Download directory: {download_dir}")
-    download_historical_data(coin_id, download_dir)
+    download_many(coin_ids, download_dir)
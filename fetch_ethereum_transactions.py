@@ -4,19 +4,30 @@ Works with Ethereum, Base, Arbitrum, Optimism, Polygon, Avalanche, BSC, Linea, K
 Fetches: normal transactions, ERC-20 transfers, and internal transactions
 """
 
-import requests
 import time
 import json
 import sys
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Any
 from ethereum_config import RATE_LIMIT_DELAY
 from chains_config import get_chain_config
-from blockchain_interface import BlockchainTransactionFetcher
+from blockchain_interface import (
+    BlockchainTransactionFetcher, CachingFetcherMixin, SHARED_SESSION, is_evm_address, post_json_rpc_batch
+)
 
 
-class EthereumTransactionFetcher(BlockchainTransactionFetcher):
+class EthereumTransactionFetcher(CachingFetcherMixin, BlockchainTransactionFetcher):
     """Fetches all transaction data from Etherscan-compatible API (supports all EVM chains)"""
     
+    # Public nodes tried in order when the configured RPC endpoint fails
+    RPC_FALLBACK_ENDPOINTS = (
+        'https://bsc-dataseed1.binance.org',
+        'https://bsc-dataseed2.binance.org',
+        'https://bsc-dataseed3.binance.org',
+        'https://bsc-dataseed4.binance.org',
+    )
+    
     def __init__(self, api_key: str, address: str, chain_name: str = 'ethereum'):
         """
         Initialize transaction fetcher for a specific chain
@@ -53,11 +64,32 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
         except ValueError as e:
             print(f"Error: {e}")
             sys.exit(1)
+        
+        # Explorer requests are spaced RATE_LIMIT_DELAY apart across all threads
+        self._rate_limit_lock = threading.Lock()
+        self._next_request_at = 0.0
+    
+    def _wait_for_rate_limit(self):
+        """Block until this fetcher may send its next explorer request"""
+        with self._rate_limit_lock:
+            now = time.monotonic()
+            wait = self._next_request_at - now
+            self._next_request_at = max(now, self._next_request_at) + RATE_LIMIT_DELAY
+        if wait > 0:
+            time.sleep(wait)
     
     def validate_address(self, address: str) -> bool:
-        """Validate EVM address format (0x prefix, 42 chars)"""
-        return address.startswith('0x') and len(address) == 42
-        
+        """Validate EVM address format (0x prefix + 40 hex digits)"""
+        return is_evm_address(address)
+        
+    def fetch_batch(self, rpc_calls: List[Dict]) -> List[Any]:
+        """Execute JSON-RPC calls as paced, retried batched POSTs (RPC and NodeReal endpoints only)"""
+        if not (self.is_rpc or self.is_nodereal):
+            return super().fetch_batch(rpc_calls)
+        return post_json_rpc_batch(self.base_url, rpc_calls,
+                                   fallback_endpoints=self.RPC_FALLBACK_ENDPOINTS,
+                                   wait_for_rate_limit=self._wait_for_rate_limit)
+    
     def _get_transaction_input(self, tx_hash: str) -> str:
         """Get transaction input data from NodeReal"""
         payload = {
@@ -67,7 +99,7 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
             'id': 1
         }
         try:
-            response = requests.post(self.base_url, json=payload, timeout=10)
+            response = SHARED_SESSION.post(self.base_url, json=payload, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if 'result' in data and data['result']:
@@ -86,7 +118,7 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
         }
         transfers = []
         try:
-            response = requests.post(self.base_url, json=payload, timeout=10)
+            response = SHARED_SESSION.post(self.base_url, json=payload, timeout=10)
             if response.status_code == 200:
                 data = response.json()
                 if 'result' in data and data['result']:
@@ -144,7 +176,7 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
         }
         
         try:
-            response = requests.post(self.base_url, json=payload, timeout=30)
+            response = SHARED_SESSION.post(self.base_url, json=payload, timeout=30)
             time.sleep(RATE_LIMIT_DELAY)  # Respect rate limit
             
             if response.status_code != 200:
@@ -231,18 +263,12 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
         }
         
         # Try multiple RPC endpoints if first one fails
-        rpc_endpoints = [
-            self.base_url,
-            'https://bsc-dataseed1.binance.org',
-            'https://bsc-dataseed2.binance.org',
-            'https://bsc-dataseed3.binance.org',
-            'https://bsc-dataseed4.binance.org',
-        ]
+        rpc_endpoints = [self.base_url, *self.RPC_FALLBACK_ENDPOINTS]
         
         for attempt in range(retries):
             for endpoint in rpc_endpoints:
                 try:
-                    response = requests.post(endpoint, json=payload, timeout=30)
+                    response = SHARED_SESSION.post(endpoint, json=payload, timeout=30)
                     time.sleep(1.0)  # Rate limit for public RPC (be conservative)
                     
                     if response.status_code != 200:
@@ -279,13 +305,16 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
             return int(result, 16)
         return None
     
-    def _get_block_timestamp(self, block_number: int) -> Optional[int]:
-        """Get block timestamp"""
-        block_hex = hex(block_number)
-        result = self._make_rpc_call('eth_getBlockByNumber', [block_hex, False])
-        if result and 'timestamp' in result:
-            return int(result['timestamp'], 16)
-        return None
+    def _get_block_timestamps(self, block_numbers) -> Dict[int, int]:
+        """Get the timestamps of several blocks in one batch (blocks that failed are left out)"""
+        block_nums = sorted(set(block_numbers))
+        blocks = self.fetch_batch([
+            {'method': 'eth_getBlockByNumber', 'params': [hex(block_num), False]} for block_num in block_nums
+        ])
+        return {
+            block_num: int(block['timestamp'], 16)
+            for block_num, block in zip(block_nums, blocks) if block and 'timestamp' in block
+        }
     
     def _fetch_token_transfers_via_rpc(self, from_block: int = 0, to_block: int = None) -> List[Dict]:
         """Fetch all ERC-20 token transfers for address using eth_getLogs"""
@@ -332,12 +361,10 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
                         to_addr = '0x' + topics[2][-40:]
                         amount = int(data, 16) if data != '0x' else 0
                         
-                        block_ts = self._get_block_timestamp(block_num) or 0
-                        
                         transfers.append({
                             'hash': tx_hash,
                             'blockNumber': str(block_num),
-                            'timeStamp': str(block_ts),
+                            'timeStamp': '0',  # Filled in below, one batch for all blocks
                             'from': from_addr,
                             'to': to_addr,
                             'value': str(amount),
@@ -381,12 +408,10 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
                                t.get('contractAddress', '').lower() == token_addr for t in transfers):
                             continue
                         
-                        block_ts = self._get_block_timestamp(block_num) or 0
-                        
                         transfers.append({
                             'hash': tx_hash,
                             'blockNumber': str(block_num),
-                            'timeStamp': str(block_ts),
+                            'timeStamp': '0',  # Filled in below, one batch for all blocks
                             'from': from_addr,
                             'to': to_addr,
                             'value': str(amount),
@@ -410,6 +435,10 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
                 print(f"    Progress: {current_from - from_block:,} blocks processed, found {len(transfers)} transfers...")
             time.sleep(0.5)  # Additional delay between chunks
         
+        block_timestamps = self._get_block_timestamps(int(t['blockNumber']) for t in transfers)
+        for transfer in transfers:
+            transfer['timeStamp'] = str(block_timestamps.get(int(transfer['blockNumber']), 0))
+        
         print(f"  ✓ Completed: Found {len(transfers)} token transfers total")
         return transfers
     
@@ -425,11 +454,20 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
         # For now, we'll get transactions from receipts of token transfers
         normal_txs = []
         
-        for tx_hash in list(tx_hashes)[:1000]:  # Limit to avoid too many calls
-            tx_data = self._make_rpc_call('eth_getTransactionByHash', [tx_hash])
+        # Batch the per-hash and per-block lookups instead of one call each
+        hashes = list(tx_hashes)[:1000]  # Limit to avoid too many calls
+        tx_datas = self.fetch_batch([
+            {'method': 'eth_getTransactionByHash', 'params': [tx_hash]} for tx_hash in hashes
+        ])
+        block_timestamps = self._get_block_timestamps(
+            int(tx_data['blockNumber'], 16) for tx_data in tx_datas
+            if tx_data and tx_data.get('blockNumber')
+        )
+        
+        for tx_hash, tx_data in zip(hashes, tx_datas):
             if tx_data:
                 block_num = int(tx_data.get('blockNumber', '0x0'), 16) if tx_data.get('blockNumber') else 0
-                block_ts = self._get_block_timestamp(block_num) if block_num else 0
+                block_ts = block_timestamps.get(block_num, 0)
                 
                 # Only include if address is sender or receiver
                 from_addr = tx_data.get('from', '').lower()
@@ -469,7 +507,7 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
         }
         
         try:
-            response = requests.get(url, params=params, timeout=30)
+            response = SHARED_SESSION.get(url, params=params, timeout=30)
             time.sleep(0.2)  # Rate limit
             
             if response.status_code != 200:
@@ -704,8 +742,8 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
             params['chainid'] = self.chain_id
         
         try:
-            response = requests.get(self.base_url, params=params, timeout=30)
-            time.sleep(RATE_LIMIT_DELAY)  # Respect rate limit
+            self._wait_for_rate_limit()  # Respect rate limit
+            response = SHARED_SESSION.get(self.base_url, params=params, timeout=30)
             
             if response.status_code != 200:
                 print(f"HTTP Error {response.status_code}: {response.text}")
@@ -783,7 +821,7 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
     
     def fetch_transactions(self, action: str, startblock: int = 0, 
                           endblock: int = 99999999, page: int = 1, 
-                          offset: int = 10000, sort: str = 'asc') -> List[Dict]:
+                          offset: int = 10000, sort: str = 'asc') -> Optional[List[Dict]]:
         """
         Fetch transactions with pagination
         
@@ -794,6 +832,9 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
             page: Page number
             offset: Number of results per page (max 10000)
             sort: 'asc' or 'desc'
+        
+        Returns:
+            List of transactions ([] when there are none), or None if the request failed
         """
         params = {
             'module': 'account',
@@ -805,32 +846,57 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
             'sort': sort
         }
         
-        return self._make_request(params) or []
+        return self._make_request(params)
     
     def fetch_all_transactions(self, action: str) -> List[Dict]:
-        """Fetch all transactions with automatic pagination"""
+        """
+        Fetch all transactions with automatic pagination
+        
+        For explorer REST APIs, transactions at least CONFIRMATION_DEPTH blocks
+        older than the newest one seen are cached on disk, and later runs only
+        fetch blocks after that settled point.
+        """
         all_txs = []
         page = 1
+        startblock = 0
+        cached_txs = []
+        cache_key = None
+        failed = False
         
         print(f"\nFetching {action} transactions...")
         
+        # Other backends ignore startblock, so they can't resume from the cache
+        if not (self.is_goldrush or self.is_rpc or self.is_nodereal):
+            # Include the backend: a different explorer may not have the same history
+            cache_key = self.cache_key(self.chain_name, self.base_url, self.address.lower(), action)
+            cached = self.load_cached(cache_key)
+            if cached:
+                cached_txs = cached['transactions']
+                startblock = cached['settled_block'] + 1
+                print(f"  {action}: {len(cached_txs)} cached transactions up to block "
+                      f"{cached['settled_block']:,}, fetching newer blocks")
+        
+        # One line per page: several actions may be fetched concurrently
         while True:
-            print(f"  Page {page}...", end=' ', flush=True)
-            txs = self.fetch_transactions(action, page=page)
+            txs = self.fetch_transactions(action, startblock=startblock, page=page)
             
             if txs is None:
-                print("\nERROR: Failed to fetch transactions. Check API key and network connection.")
+                print(f"  {action} page {page}: ERROR: Failed to fetch transactions. Check API key and network connection.")
+                failed = True
                 break
             
             if len(txs) == 0:
                 if page == 1:
-                    print("No transactions found for this address.")
+                    if cached_txs:
+                        print(f"  {action} page {page}: No new transactions.")
+                    else:
+                        print(f"  {action} page {page}: No transactions found for this address.")
                 else:
-                    print("No more transactions.")
+                    print(f"  {action} page {page}: No more transactions.")
                 break
             
             all_txs.extend(txs)
-            print(f"Got {len(txs)} transactions (total: {len(all_txs)})")
+            print(f"  {action} page {page}: Got {len(txs)} transactions (total: {len(all_txs)})")
             
             # If we got less than the max, we're done
             if len(txs) < 10000:
@@ -838,6 +904,17 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
             
             page += 1
         
+        all_txs = cached_txs + all_txs
+        
+        if cache_key and not failed and all_txs:
+            newest_block = max(int(tx.get('blockNumber', 0)) for tx in all_txs)
+            settled_block = newest_block - self.CONFIRMATION_DEPTH
+            if settled_block >= 0:
+                self.store_cached(cache_key, {
+                    'settled_block': settled_block,
+                    'transactions': [tx for tx in all_txs if int(tx.get('blockNumber', 0)) <= settled_block],
+                })
+        
         print(f"✓ Retrieved {len(all_txs)} {action} transactions total\n")
         return all_txs
     
@@ -846,14 +923,16 @@ class EthereumTransactionFetcher(BlockchainTransactionFetcher):
         print(f"Fetching all transactions for address: {self.address}")
         print("=" * 60)
         
-        # Fetch normal transactions
-        normal_txs = self.fetch_all_transactions('txlist')
+        actions = ('txlist', 'tokentx', 'txlistinternal')  # normal, ERC-20, internal
         
-        # Fetch ERC-20 token transfers
-        erc20_txs = self.fetch_all_transactions('tokentx')
-        
-        # Fetch internal transactions
-        internal_txs = self.fetch_all_transactions('txlistinternal')
+        if self.is_goldrush or self.is_rpc or self.is_nodereal:
+            # These backends pace their own (heavier) calls; keep them sequential
+            normal_txs, erc20_txs, internal_txs = [self.fetch_all_transactions(a) for a in actions]
+        else:
+            # Explorer REST API: the three lists are independent, so overlap
+            # their round trips; the shared rate limiter caps the request rate
+            with ThreadPoolExecutor(max_workers=len(actions)) as executor:
+                normal_txs, erc20_txs, internal_txs = executor.map(self.fetch_all_transactions, actions)
         
         return {
             "address": self.address,
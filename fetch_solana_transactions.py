@@ -3,12 +3,11 @@ Fetch Solana transactions for a given address
 Uses Solana RPC API to fetch transactions and token transfers
 """
 
-import requests
 import time
 import json
 import sys
-from typing import List, Dict, Optional
-from blockchain_interface import BlockchainTransactionFetcher
+from typing import List, Dict, Optional, Any
+from blockchain_interface import BlockchainTransactionFetcher, SHARED_SESSION, post_json_rpc_batch
 from chains_config import get_chain_config
 
 
@@ -50,6 +49,10 @@ class SolanaTransactionFetcher(BlockchainTransactionFetcher):
             return False
         return True
     
+    def fetch_batch(self, rpc_calls: List[Dict]) -> List[Any]:
+        """Execute JSON-RPC calls as batched POSTs"""
+        return post_json_rpc_batch(self.rpc_endpoint, rpc_calls)
+    
     def _make_rpc_request(self, method: str, params: List) -> Optional[Dict]:
         """Make a JSON-RPC request to Solana RPC endpoint"""
         payload = {
@@ -60,7 +63,7 @@ class SolanaTransactionFetcher(BlockchainTransactionFetcher):
         }
         
         try:
-            response = requests.post(self.rpc_endpoint, json=payload, timeout=30)
+            response = SHARED_SESSION.post(self.rpc_endpoint, json=payload, timeout=30)
             time.sleep(0.25)  # Rate limiting
             
             if response.status_code != 200:
@@ -3,14 +3,19 @@ Fetch Sui transactions for a given address
 Uses Sui GraphQL API for reliable pagination and filtering
 """
 
+import re
 import requests
 import time
 import json
 import sys
-from typing import List, Dict, Optional
-from blockchain_interface import BlockchainTransactionFetcher
+from typing import List, Dict, Optional, Any
+from blockchain_interface import BlockchainTransactionFetcher, SHARED_SESSION, post_json_rpc_batch
 from chains_config import get_chain_config
 
+# Sui address format (32 bytes hex), compiled once. Used with fullmatch:
+# $ would also accept a trailing newline
+_SUI_ADDRESS_RE = re.compile(r'0x[0-9a-fA-F]{64}')
+
 
 class SuiTransactionFetcher(BlockchainTransactionFetcher):
     """Fetches all transaction data from Sui GraphQL API"""
@@ -42,17 +47,7 @@ class SuiTransactionFetcher(BlockchainTransactionFetcher):
     
     def validate_address(self, address: str) -> bool:
         """Validate Sui address format (0x prefix, 66 chars total)"""
-        if not address:
-            return False
-        if not address.startswith('0x'):
-            return False
-        if len(address) != 66:
-            return False
-        try:
-            int(address, 16)
-            return True
-        except ValueError:
-            return False
+        return bool(address) and _SUI_ADDRESS_RE.fullmatch(address) is not None
     
     def _make_graphql_request(self, query: str, retries: int = 3) -> Optional[Dict]:
         """Make a GraphQL request to Sui GraphQL endpoint"""
@@ -60,7 +55,7 @@ class SuiTransactionFetcher(BlockchainTransactionFetcher):
         
         for attempt in range(retries):
             try:
-                response = requests.post(
+                response = SHARED_SESSION.post(
                     self.GRAPHQL_ENDPOINT,
                     json={'query': query},
                     headers=headers,
@@ -93,6 +88,11 @@ class SuiTransactionFetcher(BlockchainTransactionFetcher):
         
         return None
     
+    def fetch_batch(self, rpc_calls: List[Dict]) -> List[Any]:
+        """Execute JSON-RPC calls as batched POSTs"""
+        headers = {'x-api-key': self.tatum_api_key} if self.tatum_api_key else None
+        return post_json_rpc_batch(self.rpc_endpoint, rpc_calls, headers=headers)
+    
     def _make_rpc_request(self, method: str, params: List, retries: int = 3) -> Optional[Dict]:
         """Make a JSON-RPC request to Sui RPC endpoint (for transaction details)"""
         payload = {
@@ -112,7 +112,7 @@ class SuiTransactionFetcher(BlockchainTransactionFetcher):
         
         for attempt in range(retries):
             try:
-                response = requests.post(self.rpc_endpoint, json=payload, headers=headers, timeout=60)
+                response = SHARED_SESSION.post(self.rpc_endpoint, json=payload, headers=headers, timeout=60)
                 time.sleep(0.3)
                 
                 if response.status_code != 200:
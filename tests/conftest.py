@@ -0,0 +1,6 @@
+"""Make the top-level scripts importable from the tests"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
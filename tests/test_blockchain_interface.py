@@ -0,0 +1,112 @@
+"""Tests for the shared fetcher helpers in blockchain_interface"""
+
+import blockchain_interface
+from blockchain_interface import is_evm_address, post_json_rpc_batch
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+    
+    def json(self):
+        return self._data
+
+
+def _answer(payload):
+    """Echo each call's params back, in reverse order to exercise id matching"""
+    return FakeResponse(200, [
+        {'jsonrpc': '2.0', 'id': call['id'], 'result': call['params'][0]}
+        for call in reversed(payload)
+    ])
+
+
+def test_rpc_batch_matches_replies_by_id_across_chunks(monkeypatch):
+    posts = []
+    
+    def post(url, json=None, **kwargs):
+        posts.append((url, [call['id'] for call in json]))
+        # The primary endpoint fails the second chunk; the fallback answers it
+        if url == 'primary' and json[0]['id'] == 3:
+            return FakeResponse(503)
+        return _answer(json)
+    
+    monkeypatch.setattr(blockchain_interface.SHARED_SESSION, 'post', post)
+    calls = [{'method': 'echo', 'params': [f'value{i}']} for i in range(7)]
+    
+    results = post_json_rpc_batch('primary', calls, batch_size=3, fallback_endpoints=['fallback'])
+    
+    assert results == [f'value{i}' for i in range(7)]
+    assert posts == [
+        ('primary', [0, 1, 2]),
+        ('primary', [3, 4, 5]),
+        ('fallback', [3, 4, 5]),
+        ('primary', [6]),
+    ]
+
+
+def test_rpc_batch_retries_only_unanswered_calls(monkeypatch):
+    posts = []
+    
+    def post(url, json=None, **kwargs):
+        posts.append([call['id'] for call in json])
+        reply = _answer(json)
+        if len(posts) == 1:
+            # First reply is rate limited for call 1 and drops call 2 entirely
+            reply._data = [
+                {'jsonrpc': '2.0', 'id': 0, 'result': 'value0'},
+                {'jsonrpc': '2.0', 'id': 1, 'error': {'code': -32005, 'message': 'rate limit exceeded'}},
+            ]
+        return reply
+    
+    monkeypatch.setattr(blockchain_interface.SHARED_SESSION, 'post', post)
+    monkeypatch.setattr(blockchain_interface.time, 'sleep', lambda seconds: None)
+    calls = [{'method': 'echo', 'params': [f'value{i}']} for i in range(3)]
+    
+    assert post_json_rpc_batch('primary', calls) == ['value0', 'value1', 'value2']
+    assert posts == [[0, 1, 2], [1, 2]]
+
+
+def test_rpc_batch_failed_chunk_leaves_none(monkeypatch, capsys):
+    waits = []
+    
+    def post(url, json=None, **kwargs):
+        if json[0]['id'] == 2:
+            return FakeResponse(500)
+        return _answer(json)
+    
+    monkeypatch.setattr(blockchain_interface.SHARED_SESSION, 'post', post)
+    monkeypatch.setattr(blockchain_interface.time, 'sleep', lambda seconds: None)
+    calls = [{'method': 'echo', 'params': [f'value{i}']} for i in range(4)]
+    
+    results = post_json_rpc_batch('primary', calls, batch_size=2, retries=2,
+                                  wait_for_rate_limit=lambda: waits.append(1))
+    
+    assert results == ['value0', 'value1', None, None]
+    # Every POST is paced: one for chunk 1, two attempts for chunk 2
+    assert len(waits) == 3
+    assert 'failed after 2 retries: [2, 3]' in capsys.readouterr().out
+
+
+def test_rpc_batch_invalid_call_is_not_retried(monkeypatch, capsys):
+    posts = []
+    
+    def post(url, json=None, **kwargs):
+        posts.append(url)
+        return FakeResponse(200, [{'jsonrpc': '2.0', 'id': 0, 'error': {'message': 'invalid argument'}}])
+    
+    monkeypatch.setattr(blockchain_interface.SHARED_SESSION, 'post', post)
+    
+    assert post_json_rpc_batch('primary', [{'method': 'echo', 'params': ['x']}],
+                               fallback_endpoints=['fallback']) == [None]
+    assert posts == ['primary']
+    assert 'invalid argument' in capsys.readouterr().out
+
+
+def test_evm_address_rejects_trailing_newline():
+    address = '0x' + 'ab' * 20
+    
+    assert is_evm_address(address)
+    assert not is_evm_address(address + '\n')
+    assert not is_evm_address(address[:-1])
+    assert not is_evm_address('')
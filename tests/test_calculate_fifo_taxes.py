@@ -0,0 +1,113 @@
+"""Fixed-point FIFO matching checked against the original Decimal implementation"""
+
+import random
+from decimal import Decimal, ROUND_DOWN
+
+import pytest
+
+import calculate_fifo_taxes
+from calculate_fifo_taxes import (
+    AMOUNT_SCALE, USD_SCALE, TokenInventory, _match_fifo, format_fixed, to_fixed,
+)
+
+
+def decimal_match_sell_fifo(lots, amount_to_sell):
+    """The Decimal FIFO matching this module used before fixed-point ints"""
+    amount_remaining = amount_to_sell
+    total_cost_basis = Decimal('0')
+    matched_trade_ids = []
+    while amount_remaining > 0 and lots:
+        lot = lots[0]
+        if lot[1] <= amount_remaining:
+            total_cost_basis += lot[2]
+            matched_trade_ids.append(lot[0])
+            amount_remaining -= lot[1]
+            lots.pop(0)
+        else:
+            cost_from_lot = lot[2] * (amount_remaining / lot[1])
+            total_cost_basis += cost_from_lot
+            matched_trade_ids.append(lot[0])
+            lot[1] -= amount_remaining
+            lot[2] -= cost_from_lot
+            amount_remaining = Decimal('0')
+    return total_cost_basis, matched_trade_ids, amount_remaining
+
+
+def _quantize(value, places):
+    """Decimal export formatting (ROUND_DOWN), in plain notation: str() gave '0E-8'"""
+    return format(value.quantize(Decimal(1).scaleb(-places), rounding=ROUND_DOWN), 'f')
+
+
+def _check_against_decimal_fifo(seed):
+    """Replay random buys and sells through TokenInventory and the Decimal version"""
+    rng = random.Random(seed)
+    inventory = TokenInventory()
+    lots = []
+    
+    for trade_id in range(2000):
+        if rng.random() < 0.6:
+            amount = Decimal(rng.randint(1, 10 ** 9)) / 10 ** rng.randint(0, 8)
+            cost = Decimal(rng.randint(1, 10 ** 8)) / 100
+            inventory.add(trade_id, to_fixed(amount, AMOUNT_SCALE), to_fixed(cost, USD_SCALE), None)
+            lots.append([trade_id, amount, cost])
+        elif len(inventory):
+            # Like the calculator, only sells against a non-empty inventory get here
+            amount = Decimal(rng.randint(1, 10 ** 9)) / 10 ** rng.randint(0, 8)
+            cost, trade_ids, uncovered = inventory.consume(to_fixed(amount, AMOUNT_SCALE))
+            ref_cost, ref_trade_ids, ref_uncovered = decimal_match_sell_fifo(lots, amount)
+            
+            assert trade_ids == ref_trade_ids
+            assert format_fixed(uncovered, AMOUNT_SCALE, 8) == _quantize(ref_uncovered, 8)
+            # Both sides truncate partial lot costs (ints at 1e-8 USD, Decimal at
+            # 28 digits): they agree far below the cent the export rounds to
+            assert abs(Decimal(format_fixed(cost, USD_SCALE, 8)) - ref_cost) <= Decimal('1e-6')
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_inventory_matches_decimal_fifo(seed):
+    _check_against_decimal_fifo(seed)
+
+
+def test_match_fifo_partial_and_exhausted():
+    # Lots of 2, 3 and 5 tokens costing 10, 30 and 100
+    cum_amounts = [2, 5, 10]
+    cum_costs = [10, 40, 140]
+    
+    # 3 tokens: all of lot 0, a third of lot 1
+    assert _match_fifo(cum_amounts, cum_costs, 0, 0, 0, 3) == (1, 2, 20, 3, 20, 0)
+    # 2 more finish lot 1 exactly
+    assert _match_fifo(cum_amounts, cum_costs, 1, 3, 20, 2) == (2, 2, 20, 5, 40, 0)
+    # 7 more exhaust lot 2 with 2 left over
+    assert _match_fifo(cum_amounts, cum_costs, 2, 5, 40, 7) == (3, 3, 100, 10, 140, 2)
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_compacted_inventory_matches_decimal_fifo(seed, monkeypatch):
+    # Compact after a handful of consumed lots so most sells run on rebased totals
+    monkeypatch.setattr(calculate_fifo_taxes, 'COMPACT_MIN_LOTS', 4)
+    _check_against_decimal_fifo(seed)
+
+
+def test_compact_drops_consumed_lots():
+    inventory = TokenInventory()
+    for trade_id in range(3000):
+        inventory.add(trade_id, 2, 10, None)
+    
+    for _ in range(1500):
+        inventory.consume(3)
+    
+    # 2250 of 3000 lots consumed: the dropped ones are gone, the rest rebased
+    assert len(inventory) == 750
+    assert len(inventory.amounts) < 3000
+    assert inventory.consume(2) == (10, [2250], 0)
+
+
+@pytest.mark.parametrize('value', [
+    '0', '1', '-1', '0.005', '-0.005', '123.456789', '-123.456789', '0.00000001', '99999999999.999999999',
+])
+@pytest.mark.parametrize('places', [2, 8])
+def test_format_fixed_matches_decimal_quantize(value, places):
+    expected = _quantize(Decimal(value), places)
+    
+    assert format_fixed(to_fixed(value, USD_SCALE), USD_SCALE, places) == expected
+    assert format_fixed(to_fixed(value, AMOUNT_SCALE), AMOUNT_SCALE, places) == expected
@@ -0,0 +1,36 @@
+"""Tests for PriceFeedBuilder symbol resolution and pricing"""
+
+import pytest
+
+import calculate_prices
+from calculate_prices import PriceFeedBuilder
+
+
+@pytest.fixture
+def builder(tmp_path, monkeypatch):
+    mapping = {'USDC': 'usd-coin', 'WSTETH': 'wrapped-steth', 'IUSD': 'iusd', 'ETH': 'ethereum'}
+    monkeypatch.setattr(calculate_prices, 'get_symbol_mapping', lambda mapping_file, force_refresh: mapping)
+    monkeypatch.setattr(PriceFeedBuilder, 'CACHE_FILE', str(tmp_path / 'price_cache.json'))
+    return PriceFeedBuilder()
+
+
+@pytest.mark.parametrize('symbol, expected', [
+    ('ETH', 'ETH'),
+    ('aEthUSDC', 'USDC'),
+    ('aArbwstETH', 'WSTETH'),
+    ('PT-iUSD-4DEC2025', 'IUSD'),
+    # Not a known protocol token: priced as itself, not as USDC
+    ('fUSDC', 'FUSDC'),
+    ('aUSDC', 'AUSDC'),
+    ('PT-USDC', 'PT-USDC'),
+])
+def test_pricing_symbol_falls_back_only_for_known_protocol_tokens(builder, symbol, expected):
+    assert builder.pricing_symbol(symbol) == expected
+
+
+def test_unpriced_stablecoin_side_is_one_dollar(builder):
+    # Neither symbol is in the CoinGecko mapping, so no request is made
+    view = calculate_prices.TradeView('USDT', 'FOO', '100', '50', 1700000000)
+    
+    assert builder.calculate_prices_for_view(view) == (1.0, 2.0, 'stablecoin_ratio')
+    assert builder.calculate_prices_for_view(view._replace(source_symbol='BAR')) == (None, None, 'unavailable')
@@ -0,0 +1,105 @@
+"""Tests for EthereumTransactionFetcher"""
+
+import pytest
+
+import blockchain_interface
+import fetch_ethereum_transactions
+from fetch_ethereum_transactions import EthereumTransactionFetcher
+
+ADDRESS = '0x' + 'ab' * 20
+
+
+class FakeResponse:
+    def __init__(self, status_code, data=None):
+        self.status_code = status_code
+        self._data = data
+    
+    def json(self):
+        return self._data
+
+
+@pytest.fixture
+def fetcher(tmp_path, monkeypatch):
+    monkeypatch.setattr(EthereumTransactionFetcher, 'FETCH_CACHE_FILE', str(tmp_path / 'fetch_cache'))
+    return EthereumTransactionFetcher('test-key', ADDRESS, 'ethereum')
+
+
+def test_fetch_batch_rejects_rest_explorers(fetcher):
+    with pytest.raises(NotImplementedError):
+        fetcher.fetch_batch([{'method': 'eth_blockNumber', 'params': []}])
+
+
+def test_token_transfers_fetch_block_timestamps_in_one_batch(fetcher, monkeypatch):
+    fetcher.is_rpc = True
+    padded = '0x' + '0' * 24 + ADDRESS[2:]
+    other = '0x' + '0' * 24 + 'cd' * 20
+    logs = {
+        # Two transfers out in block 0x10, one in from block 0x20
+        'from': [
+            {'transactionHash': '0x1', 'blockNumber': '0x10', 'address': '0xt1', 'topics': ['sig', padded, other], 'data': '0x5'},
+            {'transactionHash': '0x2', 'blockNumber': '0x10', 'address': '0xt2', 'topics': ['sig', padded, other], 'data': '0x6'},
+        ],
+        'to': [
+            {'transactionHash': '0x3', 'blockNumber': '0x20', 'address': '0xt1', 'topics': ['sig', other, padded], 'data': '0x7'},
+        ],
+    }
+    monkeypatch.setattr(fetcher, '_make_rpc_call',
+                        lambda method, params: logs['from' if params[0]['topics'][1] else 'to'])
+    monkeypatch.setattr(fetch_ethereum_transactions.time, 'sleep', lambda seconds: None)
+    posts = []
+    
+    def post(url, json=None, **kwargs):
+        posts.append(json)
+        return FakeResponse(200, [
+            {'jsonrpc': '2.0', 'id': call['id'], 'result': {'timestamp': hex(int(call['params'][0], 16) * 100)}}
+            for call in json
+        ])
+    
+    monkeypatch.setattr(blockchain_interface.SHARED_SESSION, 'post', post)
+    
+    transfers = fetcher._fetch_token_transfers_via_rpc(0, 999)
+    
+    assert [(t['hash'], t['timeStamp']) for t in transfers] == [('0x1', '1600'), ('0x2', '1600'), ('0x3', '3200')]
+    # One POST carrying one eth_getBlockByNumber per distinct block
+    assert len(posts) == 1
+    assert [call['params'][0] for call in posts[0]] == ['0x10', '0x20']
+
+
+def _page(first_block, count):
+    return [{'hash': f'0x{first_block + i:064x}', 'blockNumber': str(first_block + i)} for i in range(count)]
+
+
+def _cache_key(fetcher, action):
+    return fetcher.cache_key(fetcher.chain_name, fetcher.base_url, ADDRESS, action)
+
+
+def test_failed_page_is_not_cached(fetcher, monkeypatch):
+    # A full first page, then a request failure on page 2
+    pages = iter([_page(1000, 10000), None])
+    monkeypatch.setattr(fetcher, '_make_request', lambda params: next(pages))
+    
+    txs = fetcher.fetch_all_transactions('txlist')
+    
+    assert len(txs) == 10000
+    assert fetcher.load_cached(_cache_key(fetcher, 'txlist')) is None
+
+
+def test_complete_fetch_caches_settled_blocks(fetcher, monkeypatch):
+    pages = iter([_page(1000, 10000), _page(11000, 10)])
+    monkeypatch.setattr(fetcher, '_make_request', lambda params: next(pages))
+    
+    txs = fetcher.fetch_all_transactions('txlist')
+    cached = fetcher.load_cached(_cache_key(fetcher, 'txlist'))
+    
+    assert len(txs) == 10010
+    assert cached['settled_block'] == 11009 - fetcher.CONFIRMATION_DEPTH
+    assert len(cached['transactions']) == 10010 - fetcher.CONFIRMATION_DEPTH
+
+
+def test_cache_key_includes_backend(fetcher):
+    assert fetcher.base_url in _cache_key(fetcher, 'txlist')
+
+
+def test_validate_address_rejects_trailing_newline(fetcher):
+    assert fetcher.validate_address(ADDRESS)
+    assert not fetcher.validate_address(ADDRESS + '\n')
@@ -0,0 +1,12 @@
+"""Tests for SuiTransactionFetcher"""
+
+from fetch_sui_transactions import SuiTransactionFetcher
+
+
+def test_validate_address_rejects_trailing_newline():
+    address = '0x' + 'cd' * 32
+    fetcher = SuiTransactionFetcher(None, address)
+    
+    assert fetcher.validate_address(address)
+    assert not fetcher.validate_address(address + '\n')
+    assert not fetcher.validate_address('0x' + 'cd' * 20)